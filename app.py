@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
 from app.api.routes import api
+from app.core.database import init_db
 from config import Config
 
 def create_app():
@@ -11,6 +12,9 @@ def create_app():
     
     # Ensure required directories exist
     Config.create_directories()
+
+    # Create tables and apply pending migrations
+    init_db()
     
     # Register blueprints
     app.register_blueprint(api, url_prefix='/api')
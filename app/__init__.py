@@ -4,6 +4,10 @@ from config import Config
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+
+    # Schema setup happens here rather than when the models are imported
+    from app.core.database import init_db
+    init_db()
     
     from app.api.routes import api
     app.register_blueprint(api, url_prefix='/api')
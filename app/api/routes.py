@@ -1,24 +1,88 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 from app.core.helper import generateBriefResponse, generateFeedback, parseBotResponse
 from datetime import datetime
-from app.core.file_extractor import load_pdf, split_text
-from app.core.rag import create_chroma_db, load_chroma_collection, generate_answer
+from app.core.file_extractor import iter_chunks, iter_pdf_pages
+from app.core.rag import (create_chroma_db, load_chroma_collection, generate_answer, generate_chat_reply,
+                          prepare_answer, stream_chat_reply, warm_up_collections,
+                          SYSTEM_INSTRUCTION, TUTOR_SYSTEM_INSTRUCTION)
 from app.core.chat_room import ChatManager
+from app.core.database import Session, commit_metrics, database_size, init_db, vacuum_database
+from app.core.diagnostics import memory_report, start_memory_tracing
+from app.core.embedding_cache import get_embedding_cache
+from app.core.ingest_jobs import enqueue_ingest_job, get_ingest_job, job_to_dict, recover_ingest_jobs
 from config import Config
-import google.generativeai as genai
-from app.core.pronounce_assessment_mic import pronunciation_assessment_from_microphone
-from app.core.intonation import pitch
+from app.core.pronounce_assessment_mic import score_pronunciation
+from app.core.stt import recognize_words
+from app.core.intonation import empty_word_pitch, pitch
+from app.core.audio import AudioDecodeError, decode_audio
+from app.core.stages import StageRunner, StageTimeout, stage_metrics
 import base64
+import json
 import tempfile
+import threading
+import uuid
 
 # Create the blueprint
-api = Blueprint('api', __name__)
+api = Blueprint('api', __name__, cli_group=None)  # CLI commands live at the top level
 
 # Initialize chat manager
 chat_manager = ChatManager(os.path.join(Config.BASE_DIR, 'data', 'chat_rooms'))
 
+@api.record_once
+def warm_up(state):
+    """Open the collections of recently active rooms in the background at worker boot"""
+    def run():
+        try:
+            # Sessions are thread-local, so this never touches a request's session
+            rooms = chat_manager.get_recently_active_rooms(limit=Config.CHROMA_WARMUP_ROOMS)
+            warm_up_collections(str(Config.VECTOR_STORE_DIR), [room.collection_name for room in rooms])
+        except Exception as e:
+            print(f'Collection warm-up failed: {str(e)}')
+        finally:
+            Session.remove()
+    threading.Thread(target=run, name='chroma-warmup', daemon=True).start()
+
+@api.record_once
+def recover_jobs(state):
+    """Requeue or fail ingestion jobs a previous worker left unfinished"""
+    try:
+        recover_ingest_jobs(chat_manager)
+    except Exception as e:
+        print(f'Ingestion job recovery failed: {str(e)}')
+    finally:
+        Session.remove()
+
+@api.record_once
+def start_tracing(state):
+    if Config.MEMORY_DEBUG:
+        start_memory_tracing(Config.TRACEMALLOC_FRAMES)
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Create tables and apply pending migrations without starting the server"""
+    init_db()
+    print('Database is up to date')
+
+@api.cli.command('compact-contexts')
+def compact_contexts():
+    """Replace conversation copies stored in old reply contexts with message id references"""
+    size_before = database_size()
+    stats = chat_manager.compact_contexts(window=Config.CONTEXT_HISTORY_WINDOW)
+    vacuum_database()
+    size_after = database_size()
+    print(f"Compacted {stats['messages']} messages: context JSON "
+          f"{stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes")
+    if size_before is not None:
+        print(f"Database size {size_before:,} -> {size_after:,} bytes")
+    Session.remove()
+
+@api.teardown_app_request
+def remove_session(exception=None):
+    """Give every request a fresh session instead of one shared for the process lifetime"""
+    Session.remove()
+
 @api.route('/', methods=['GET'])
 def index():
     # Get all chat rooms for the sidebar
@@ -53,16 +117,18 @@ def create_room():
             file.save(file_path)
             
             # Process file for RAG
-            pdf_text = load_pdf(file_path=file_path)
-            chunked_text = split_text(text=pdf_text)
+            chunked_text = iter_chunks(iter_pdf_pages(file_path))
             
             # Create ChromaDB collection
             collection_name = f"collection_{int(datetime.now().timestamp())}"
-            create_chroma_db(
-                documents=chunked_text,
-                path=Config.VECTOR_STORE_DIR,
-                name=collection_name
-            )
+            try:
+                create_chroma_db(
+                    documents=chunked_text,
+                    path=Config.VECTOR_STORE_DIR,
+                    name=collection_name
+                )
+            except Exception as e:
+                return jsonify({'error': 'Failed to process document', 'details': str(e)}), 500
             
             file_context = file_path
     
@@ -80,19 +146,46 @@ def create_room():
         'has_file': bool(room.file_context)
     })
 
+def message_to_dict(msg, include_context: bool = True) -> dict:
+    data = {
+        'id': msg.id,
+        'content': msg.content,
+        'role': msg.role,
+        'timestamp': msg.timestamp
+    }
+    if include_context:
+        data['context'] = msg.context
+    return data
+
 @api.route('/rooms/<room_id>/messages', methods=['GET'])
 def get_messages(room_id):
+    """
+    Without paging parameters, returns every message (legacy behaviour). With
+    `limit`, `before` or `after`, returns {messages, next_cursor}, newest page
+    first unless `after` is given; `include_context=0` leaves out message context.
+    """
+    include_context = request.args.get('include_context', '1').lower() not in ('0', 'false')
+    paginated = any(param in request.args for param in ('limit', 'before', 'after'))
     try:
-        messages = chat_manager.get_room_history(room_id)
-        return jsonify([{
-            'content': msg.content,
-            'role': msg.role,
-            'timestamp': msg.timestamp,
-            'context': msg.context
-        } for msg in messages])
+        if not paginated:
+            messages = chat_manager.get_room_history(room_id)
+            return jsonify([message_to_dict(msg, include_context) for msg in messages])
+
+        limit = min(max(request.args.get('limit', Config.MESSAGE_PAGE_SIZE, type=int), 1), Config.MESSAGE_PAGE_MAX)
+        messages, next_cursor = chat_manager.get_message_page(
+            room_id,
+            limit=limit,
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            include_context=include_context
+        )
+        return jsonify({
+            'messages': [message_to_dict(msg, include_context) for msg in messages],
+            'next_cursor': next_cursor
+        })
     except ValueError as e:
-        return jsonify({'error': str(e)}), 404
-    
+        return jsonify({'error': str(e)}), 400
+
 @api.route('/rooms/<int:room_id>/upload', methods=['POST'])
 def upload(room_id):
     try:
@@ -112,64 +205,27 @@ def upload(room_id):
         filename = secure_filename(f"{int(datetime.now().timestamp())}_{file.filename}")
         file_path = os.path.join(Config.DOCUMENT_DIR, filename)
         file.save(file_path)
-        
-        try:
-            print("1")
-            # Process file for RAG - with status updates
-            chat_manager.add_message(
-                room_id=room_id,
-                content="Processing document... This may take a moment.",
-                role="system"
-            )
-            
-            # Load and chunk the PDF
-            pdf_text = load_pdf(file_path=file_path)
-            chunked_text = split_text(
-                text=pdf_text,
-                chunk_size=500,  # Smaller chunks for faster processing
-                chunk_overlap=50  # Minimal overlap
-            )
-            print("2")
-            
-            # Create ChromaDB collection with optimized settings
-            collection_name = f"collection_{int(datetime.now().timestamp())}"
-            create_chroma_db(
-                documents=chunked_text,
-                path=Config.VECTOR_STORE_DIR,
-                name=collection_name
-            )
 
-            print("2.1")
-            
-            # Update room with file context
-            chat_manager.update_room(
-                room_id=room_id,
-                file_context=file_path,
-                collection_name=collection_name
-            )
-            print("3")
-            
-            # Add success message
-            chat_manager.add_message(
-                room_id=room_id,
-                content=f"Document processed successfully! You can now ask questions about {file.filename}",
-                role="system"
-            )
+        chat_manager.add_message(
+            room_id=room_id,
+            content="Processing document... This may take a moment.",
+            role="system"
+        )
 
-            print("4")
-            
-            return jsonify({
-                'message': 'File uploaded and processed successfully',
-                'filename': filename,
-                'collection': collection_name
-            })
-            
-        except Exception as e:
-            # Clean up on error
-            print(e)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise e
+        # Extraction and indexing run on the background ingest pool
+        job = enqueue_ingest_job(
+            chat_manager,
+            room_id=room_id,
+            file_path=file_path,
+            filename=file.filename
+        )
+
+        return jsonify({
+            'message': 'File uploaded, processing started',
+            'filename': filename,
+            'job_id': job.id,
+            'status_url': f"/api/jobs/{job.id}"
+        }), 202
             
     except Exception as e:
         print(f'Error processing file: {str(e)}')
@@ -177,6 +233,57 @@ def upload(room_id):
             'error': f'Error processing file: {str(e)}'
         }), 500
 
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_ingest_job(chat_manager, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+def conversation_context(chat_history, query: str) -> dict:
+    """
+    Context stored with tutor replies. It references a bounded window of the
+    preceding messages by id rather than copying the whole conversation into
+    every row, which made storage grow quadratically with room length.
+    """
+    window = chat_history[-Config.CONTEXT_HISTORY_WINDOW:] if Config.CONTEXT_HISTORY_WINDOW else []
+    return {
+        'history_message_ids': [msg.id for msg in window],
+        'current_query': {
+            'content': query,
+            'timestamp': datetime.now().isoformat()
+        }
+    }
+
+def voice_reply(collection_name, query: str, chat_history, formatted_history):
+    """The voice_chat answer and its stored context; touches no database session"""
+    if collection_name:
+        store_path = str(Config.VECTOR_STORE_DIR)
+        db = load_chroma_collection(path=store_path, name=collection_name)
+        result = generate_answer(db=db, query=query, chat_history=formatted_history, store_path=store_path)
+        return result['answer'], {
+            'passages': result['supporting_info']['passages'],
+            'metadata': result['supporting_info']['metadata']
+        }
+    content = generate_chat_reply(
+        query,
+        chat_history=formatted_history,
+        system_instruction=TUTOR_SYSTEM_INSTRUCTION
+    )
+    return content, conversation_context(chat_history, query)
+
+def synthesize_reply(response_content: str) -> str:
+    """Base64 WAV of the spoken reply. The temp file is removed here, even if the request stopped waiting"""
+    from app.core.tts import text_to_speech
+    response_audio_path = str(Config.TEMP_DIR / f'response_{uuid.uuid4().hex}.wav')
+    try:
+        text_to_speech('en-US-Standard-C', parseBotResponse(response_content), response_audio_path)
+        with open(response_audio_path, 'rb') as audio_file:
+            return base64.b64encode(audio_file.read()).decode('utf-8')
+    finally:
+        if os.path.exists(response_audio_path):
+            os.unlink(response_audio_path)
+
 @api.route('/rooms/<int:room_id>/chat', methods=['POST'])
 def chat(room_id):
     try:
@@ -208,18 +315,24 @@ def chat(room_id):
             content=user_message,
             role='user'
         )
+
+        # Opt-in token streaming over server-sent events
+        if data.get('stream') or request.args.get('stream') == '1':
+            return stream_chat(room_id, room.collection_name, user_message, chat_history, formatted_history)
         
         # Generate response
         if room.collection_name:
             # Use RAG for rooms with documents
+            store_path = str(Config.VECTOR_STORE_DIR)
             db = load_chroma_collection(
-                path=str(Config.VECTOR_STORE_DIR),
+                path=store_path,
                 name=room.collection_name
             )
             result = generate_answer(
                 db=db,
                 query=user_message,
-                chat_history=formatted_history
+                chat_history=formatted_history,
+                store_path=store_path
             )
             response_content = result['answer']
             context = {
@@ -228,36 +341,13 @@ def chat(room_id):
             }
         else:
             # Use regular chat for rooms without documents
-            # Format messages for Gemini
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            chat = model.start_chat(history=formatted_history)
-            
-            # Add system message
-            chat.send_message("""You are a friendly and engaging English language tutor. 
-Your responses should be:
-1. Natural and conversational - like talking to a friend
-2. Warm and encouraging - always find something positive to say
-3. Specific and actionable - give clear, practical advice
-4. Brief but meaningful - keep responses concise but helpful
-5. Personal - use "you" and "your" to make it more engaging
-
-Remember to:
-- Start with a friendly greeting or acknowledgment
-- Use contractions (e.g., "you're" instead of "you are")
-- Keep the tone light and supportive""")
-            
-            # Send user message and get response
-            response = chat.send_message(user_message)
-            
-            response_content = response.text
+            response_content = generate_chat_reply(
+                user_message,
+                chat_history=formatted_history,
+                system_instruction=TUTOR_SYSTEM_INSTRUCTION
+            )
             # Include conversation context
-            context = {
-                'conversation_history': formatted_history,
-                'current_query': {
-                    'content': user_message,
-                    'timestamp': datetime.now().isoformat()
-                }
-            }
+            context = conversation_context(chat_history, user_message)
         
         # Add assistant response
         response = chat_manager.add_message(
@@ -278,12 +368,71 @@ Remember to:
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chat(room_id, collection_name, user_message, chat_history, formatted_history):
+    """Stream the assistant reply as `token` events, then persist it and send a `done` event"""
+    if collection_name:
+        store_path = str(Config.VECTOR_STORE_DIR)
+        db = load_chroma_collection(
+            path=store_path,
+            name=collection_name
+        )
+        prompt, supporting_info = prepare_answer(db, user_message, store_path=store_path)
+        tokens = stream_chat_reply(prompt, formatted_history, system_instruction=SYSTEM_INSTRUCTION)
+        context = {
+            'passages': supporting_info['passages'],
+            'metadata': supporting_info['metadata']
+        }
+    else:
+        tokens = stream_chat_reply(user_message, formatted_history, system_instruction=TUTOR_SYSTEM_INSTRUCTION)
+        context = conversation_context(chat_history, user_message)
+
+    def events():
+        pieces = []
+        try:
+            for text in tokens:
+                pieces.append(text)
+                yield sse_event('token', {'text': text})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+            return
+
+        # The assistant message is written once, after the last token, and not
+        # queued even in write-behind mode: the done event carries its id
+        response = chat_manager.add_message(
+            room_id=room_id,
+            content="".join(pieces),
+            role='assistant',
+            context=context,
+            immediate=True
+        )
+        yield sse_event('done', {
+            'id': response.id,
+            'role': response.role,
+            'timestamp': response.timestamp.isoformat(),
+            'context': response.context
+        })
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @api.route('/rooms/<int:room_id>/voice_chat', methods=['POST'])
 def voice_chat(room_id):
-    temp_audio_path = None
-    temp_wav_path = None
-    response_audio_path = None
-    
+    """
+    Transcribes the clip, then overlaps the stages that only need the
+    transcript: pronunciation scoring, pitch analysis and reply generation run
+    on the stage pool while this thread loads history and stores the user
+    message. TTS starts as soon as the reply is ready. All database work stays
+    on the request thread.
+    """
+    stages = StageRunner()
+
     try:
         data = request.get_json()
         if not data or 'audio' not in data:
@@ -292,6 +441,7 @@ def voice_chat(room_id):
         room = chat_manager.get_room(room_id)
         if not room:
             return jsonify({'error': 'Room not found'}), 404
+        collection_name = room.collection_name
 
         # Decode base64 audio data
         try:
@@ -299,37 +449,19 @@ def voice_chat(room_id):
         except Exception as e:
             return jsonify({'error': 'Invalid audio data format'}), 400
 
-        # Save initial audio to temporary file (WebM)
-        temp_audio_path = str(Config.TEMP_DIR / f'audio_{datetime.now().timestamp()}.webm')
-        temp_wav_path = str(Config.TEMP_DIR / f'audio_{datetime.now().timestamp()}.wav')
-        response_audio_path = str(Config.TEMP_DIR / f'response_{datetime.now().timestamp()}.wav')
-        
-        try:
-            with open(temp_audio_path, 'wb') as temp_audio:
-                temp_audio.write(audio_data)
-        except Exception as e:
-            return jsonify({'error': 'Failed to save audio file'}), 500
-
-        # Convert WebM to WAV using ffmpeg
+        # Decode the upload (WebM from the browser) once; every stage shares this buffer
         try:
-            import subprocess
-            subprocess.run([
-                'ffmpeg', '-i', temp_audio_path,
-                '-acodec', 'pcm_s16le',
-                '-ar', '16000',
-                '-ac', '1',
-                temp_wav_path
-            ], check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
+            audio = stages.run('decode', decode_audio, audio_data)
+        except AudioDecodeError as e:
             return jsonify({
                 'error': 'Failed to convert audio format',
-                'details': str(e.stderr)
+                'details': str(e)
             }), 500
 
-        # Get the transcribed text from audio
+        # One recognition request serves both the transcript and pronunciation scoring
         try:
-            from app.core.stt import recognize_from_microphone
-            transcribed_text = recognize_from_microphone(temp_wav_path)
+            recognition = stages.run('recognition', recognize_words, audio)
+            transcribed_text = recognition.transcript
 
             print("transcribed_text", transcribed_text)
             
@@ -345,24 +477,41 @@ def voice_chat(room_id):
                 'details': str(e)
             }), 500
 
+        # Everything below needs only the transcript, so start the slow stages now
+        input_words = transcribed_text.split()
+        stages.submit('pronunciation', score_pronunciation, transcribed_text, recognition.words)
+        stages.submit('pitch', pitch, recognition.words, audio)
+
+        # Get the full chat history for this room
+        chat_history = stages.run('history', chat_manager.get_room_history, room_id)
+        
+        # Format chat history for context
+        formatted_history = [
+            {
+                'role': msg.role,
+                'parts': [{'text': msg.content}]
+            }
+            for msg in chat_history
+        ]
+        stages.submit('generation', voice_reply, collection_name, transcribed_text, chat_history, formatted_history)
+
         # Get pronunciation assessment
         try:
             accuracy_score, completeness_score, fluency_score, word_evaluation, final_words = \
-                pronunciation_assessment_from_microphone('en-US', transcribed_text, str(temp_wav_path))
+                stages.result('pronunciation')
         except Exception as e:
             print(f"Pronunciation assessment error: {str(e)}")
             # Provide default values if pronunciation assessment fails
             accuracy_score = completeness_score = fluency_score = 0
             word_evaluation = [f"Could not evaluate pronunciation: {str(e)}"]
-            final_words = [{'word': word, 'error_type': 'Unknown'} for word in transcribed_text.split()]
+            final_words = [{'word': word, 'error_type': 'Unknown'} for word in input_words]
 
         # Get pitch analysis
-        input_words = transcribed_text.split()
         try:
-            per_word_pitch, overall_pitch = pitch(input_words, str(temp_wav_path))
+            per_word_pitch, overall_pitch = stages.result('pitch')
         except Exception as e:
             print(f"Pitch analysis error: {str(e)}")
-            per_word_pitch = [f"{word}: N/A" for word in input_words]
+            per_word_pitch = [empty_word_pitch(word) for word in recognition.words]
             overall_pitch = 0
 
         # Calculate speech quality score
@@ -376,97 +525,46 @@ def voice_chat(room_id):
             (fluency_score * 0.2) +           # 20% weight to fluency
             (correct_pronunciation_percentage * 0.1)  # 10% weight to pronunciation
         )
+        speech_metrics = {
+            'accuracy': round(accuracy_score, 2),
+            'completeness': round(completeness_score, 2),
+            'fluency': round(fluency_score, 2),
+            'pronunciation_accuracy': round(correct_pronunciation_percentage, 2),
+            'speech_quality': round(speech_quality, 2),
+            'word_evaluation': word_evaluation,
+            'pitch_analysis': per_word_pitch,
+            'overall_pitch': round(overall_pitch, 2)
+        }
 
-        # Get the full chat history for this room
-        chat_history = chat_manager.get_room_history(room_id)
-        
-        # Format chat history for context
-        formatted_history = [
-            {
-                'role': msg.role,
-                'parts': [{'text': msg.content}]
-            }
-            for msg in chat_history
-        ]
+        # Add user message with speech metrics while the reply is still generating
+        stages.run('store_user_message', chat_manager.add_message,
+                   room_id=room_id,
+                   content=transcribed_text,
+                   role='user',
+                   context={'speech_metrics': speech_metrics})
 
-        # Add user message with speech metrics
-        chat_manager.add_message(
-            room_id=room_id,
-            content=transcribed_text,
-            role='user',
-            context={
-                'speech_metrics': {
-                    'accuracy': round(accuracy_score, 2),
-                    'completeness': round(completeness_score, 2),
-                    'fluency': round(fluency_score, 2),
-                    'pronunciation_accuracy': round(correct_pronunciation_percentage, 2),
-                    'speech_quality': round(speech_quality, 2),
-                    'word_evaluation': word_evaluation,
-                    'pitch_analysis': per_word_pitch,
-                    'overall_pitch': round(overall_pitch, 2)
-                }
-            }
-        )
+        try:
+            response_content, context = stages.result('generation')
+        except StageTimeout as e:
+            return jsonify({'error': 'Response generation timed out', 'details': str(e)}), 504
 
-        # Generate response using existing logic
-        if room.collection_name:
-            db = load_chroma_collection(path=str(Config.VECTOR_STORE_DIR), name=room.collection_name)
-            result = generate_answer(db=db, query=transcribed_text, chat_history=formatted_history)
-            response_content = result['answer']
-            context = {
-                'passages': result['supporting_info']['passages'],
-                'metadata': result['supporting_info']['metadata']
-            }
-        else:
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            chat = model.start_chat(history=formatted_history)
-            
-            # Add system message
-            chat.send_message("""You are a friendly and engaging English language tutor. 
-Your responses should be:
-1. Natural and conversational - like talking to a friend
-2. Warm and encouraging - always find something positive to say
-3. Specific and actionable - give clear, practical advice
-4. Brief but meaningful - keep responses concise but helpful
-5. Personal - use "you" and "your" to make it more engaging
-
-Remember to:
-- Start with a friendly greeting or acknowledgment
-- Use contractions (e.g., "you're" instead of "you are")
-- Keep the tone light and supportive""")
-            
-            # Send user message and get response
-            response = chat.send_message(transcribed_text)
-            
-            response_content = response.text
-            context = {
-                'conversation_history': formatted_history,
-                'current_query': {
-                    'content': transcribed_text,
-                    'timestamp': datetime.now().isoformat()
-                }
-            }
+        # Convert response to speech (tutor rooms only), storing the reply meanwhile
+        if not collection_name:
+            stages.submit('tts', synthesize_reply, response_content)
 
-            # Convert response to speech
+        # Add assistant response
+        response = stages.run('store_reply', chat_manager.add_message,
+                              room_id=room_id,
+                              content=response_content,
+                              role='assistant',
+                              context=context)
+
+        response_audio = None
+        if not collection_name:
             try:
-                from app.core.tts import text_to_speech
-                text_for_speech = parseBotResponse(response_content)
-                text_to_speech('en-US-Standard-C', text_for_speech, str(response_audio_path))
-
-                # Read response audio file and convert to base64
-                with open(response_audio_path, 'rb') as audio_file:
-                    response_audio = base64.b64encode(audio_file.read()).decode('utf-8')
+                response_audio = stages.result('tts')
             except Exception as e:
                 print(f"TTS error: {str(e)}")
-                response_audio = None
-
-        # Add assistant response
-        response = chat_manager.add_message(
-            room_id=room_id,
-            content=response_content,
-            role='assistant',
-            context=context
-        )
 
         result = {
             'transcription': transcribed_text,
@@ -474,17 +572,11 @@ Remember to:
             'role': response.role,
             'timestamp': response.timestamp.isoformat(),
             'context': response.context,
-            'speech_metrics': {
-                'accuracy': round(accuracy_score, 2),
-                'completeness': round(completeness_score, 2),
-                'fluency': round(fluency_score, 2),
-                'pronunciation_accuracy': round(correct_pronunciation_percentage, 2),
-                'speech_quality': round(speech_quality, 2),
-                'word_evaluation': word_evaluation,
-                'pitch_analysis': per_word_pitch,
-                'overall_pitch': round(overall_pitch, 2)
-            }
+            'speech_metrics': speech_metrics,
+            'stage_timings_ms': stages.timings()
         }
+        if stages.timed_out:
+            result['timed_out_stages'] = stages.timed_out
         
         if response_audio:
             result['response_audio'] = response_audio
@@ -494,44 +586,66 @@ Remember to:
     except Exception as e:
         print(f"Voice chat error: {str(e)}")
         return jsonify({'error': str(e)}), 500
-        
-    finally:
-        # Clean up temporary files
-        if temp_audio_path and os.path.exists(str(temp_audio_path)):
-            try:
-                os.unlink(temp_audio_path)
-            except:
-                pass
-        if temp_wav_path and os.path.exists(str(temp_wav_path)):
-            try:
-                os.unlink(temp_wav_path)
-            except:
-                pass
-        if response_audio_path and os.path.exists(str(response_audio_path)):
-            try:
-                os.unlink(response_audio_path)
-            except:
-                pass
 
 @api.route('/rooms/<int:room_id>/recap', methods=['GET'])
 def recap(room_id):
-    messages = chat_manager.get_room_history(room_id)
-    # Filter for user messages with speech metrics
-    metrics = [msg.context.get('speech_metrics') for msg in messages if msg.role == 'user' and msg.context and 'speech_metrics' in msg.context]
-    if not metrics:
+    """
+    Average speech metrics of the room, read from the incremental rollups.
+    With `start` and/or `end` (YYYY-MM-DD), averages that date range and adds a
+    `daily` breakdown to show progress over time.
+    """
+    start, end = request.args.get('start'), request.args.get('end')
+    try:
+        for day in (start, end):
+            if day:
+                datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+
+    rollups = chat_manager.get_speech_rollups(room_id, start=start, end=end)
+    total = sum(rollup.count for rollup in rollups)
+    if not total:
         return jsonify({'error': 'No speech metrics found'}), 404
 
-    # Calculate averages or whatever summary you want
-    avg_accuracy = sum(m['accuracy'] for m in metrics) / len(metrics)
-    avg_fluency = sum(m['fluency'] for m in metrics) / len(metrics)
-    avg_pronunciation = sum(m['pronunciation_accuracy'] for m in metrics) / len(metrics)
-    avg_quality = sum(m['speech_quality'] for m in metrics) / len(metrics)
+    def summary(rollups):
+        count = sum(rollup.count for rollup in rollups)
+        return {
+            'average_accuracy': round(sum(r.accuracy_sum for r in rollups) / count, 2),
+            'average_fluency': round(sum(r.fluency_sum for r in rollups) / count, 2),
+            'average_pronunciation': round(sum(r.pronunciation_accuracy_sum for r in rollups) / count, 2),
+            'average_quality': round(sum(r.speech_quality_sum for r in rollups) / count, 2),
+            'total_messages': count
+        }
 
-    # You can add more stats as needed
+    result = summary(rollups)
+    if start or end:
+        result['daily'] = [dict(date=rollup.period, **summary([rollup])) for rollup in rollups]
+    return jsonify(result)
+
+@api.route('/stats/embedding_cache', methods=['GET'])
+def embedding_cache_stats():
+    cache = get_embedding_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@api.route('/stats/db', methods=['GET'])
+def db_stats():
+    """Commit counts and latencies of this worker, to compare direct and write-behind modes"""
+    write_behind = chat_manager.write_behind
     return jsonify({
-        'average_accuracy': round(avg_accuracy, 2),
-        'average_fluency': round(avg_fluency, 2),
-        'average_pronunciation': round(avg_pronunciation, 2),
-        'average_quality': round(avg_quality, 2),
-        'total_messages': len(metrics)
-    })
\ No newline at end of file
+        'write_behind': write_behind.stats() if write_behind else None,
+        **commit_metrics.stats()
+    })
+
+@api.route('/stats/voice', methods=['GET'])
+def voice_stats():
+    """Per-stage voice_chat latencies of this worker"""
+    return jsonify(stage_metrics.stats())
+
+@api.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    """Memory and identity-map report for soak tests; only available with MEMORY_DEBUG"""
+    if not Config.MEMORY_DEBUG:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(memory_report(limit=request.args.get('limit', 20, type=int)))
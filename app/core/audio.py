@@ -0,0 +1,149 @@
+import io
+import subprocess
+import threading
+from functools import cached_property
+from typing import Union
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+from config import Config
+
+try:
+    import av  # PyAV (optional): decodes browser WebM/Opus in-process, without spawning ffmpeg
+except ImportError:
+    av = None
+
+# Caps the ffmpeg processes a worker runs at once; extra requests wait their turn
+_decoder_slots = threading.BoundedSemaphore(Config.AUDIO_DECODER_CONCURRENCY)
+
+
+class AudioDecodeError(Exception):
+    """Raised when uploaded audio cannot be decoded"""
+
+
+class AudioBuffer:
+    """
+    One decoded clip, shared by every voice_chat stage. The samples array is
+    read-only, so stages can pass it around without copying, and the PCM16
+    bytes the Speech-to-Text API wants are encoded once on first use.
+
+    `offset` is where the clip starts, in seconds, within the upload it was cut
+    from, so times measured on a trimmed copy map back onto the original.
+    """
+    def __init__(self, samples: np.ndarray, sample_rate: int, offset: float = 0.0):
+        samples = np.ascontiguousarray(samples, dtype=np.float32)
+        samples.flags.writeable = False
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.offset = offset
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    @property
+    def duration(self) -> float:
+        """Length in seconds"""
+        return len(self.samples) / self.sample_rate
+
+    @cached_property
+    def pcm16(self) -> bytes:
+        """LINEAR16 view of the samples"""
+        return to_pcm16(self.samples)
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1) if samples.ndim > 1 else samples
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Polyphase resampling, much cheaper than FFT resampling for long clips"""
+    if source_rate == target_rate:
+        return samples
+    divisor = np.gcd(source_rate, target_rate)
+    return signal.resample_poly(samples, target_rate // divisor, source_rate // divisor).astype(np.float32)
+
+
+def _decode_in_process(data: bytes, sample_rate: int) -> np.ndarray:
+    """WAV, FLAC and Ogg via libsndfile, without leaving the process"""
+    samples, source_rate = sf.read(io.BytesIO(data), dtype='float32')
+    return resample(to_mono(samples), source_rate, sample_rate)
+
+
+def _decode_with_av(data: bytes, sample_rate: int) -> np.ndarray:
+    """Containers libsndfile can't read (e.g. browser WebM/Opus), through FFmpeg's libraries in-process"""
+    resampler = av.AudioResampler(format='flt', layout='mono', rate=sample_rate)
+    chunks = []
+    try:
+        with av.open(io.BytesIO(data), mode='r') as container:
+            for frame in container.decode(audio=0):
+                chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+            # Samples still buffered in the resampler
+            chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+    except (av.error.FFmpegError, IndexError) as e:  # IndexError: no audio stream
+        raise AudioDecodeError(str(e))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def _decode_with_ffmpeg(data: bytes, sample_rate: int) -> np.ndarray:
+    """Any container ffmpeg understands (e.g. browser WebM/Opus), piped through stdin/stdout"""
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ar', str(sample_rate), '-ac', '1',
+        'pipe:1'
+    ]
+    with _decoder_slots:
+        try:
+            result = subprocess.run(command, input=data, capture_output=True,
+                                    timeout=Config.AUDIO_DECODE_TIMEOUT, check=True)
+        except subprocess.CalledProcessError as e:
+            raise AudioDecodeError(e.stderr.decode('utf-8', errors='replace').strip())
+        except subprocess.TimeoutExpired:
+            raise AudioDecodeError(f'ffmpeg did not finish within {Config.AUDIO_DECODE_TIMEOUT}s')
+        except FileNotFoundError:
+            raise AudioDecodeError('ffmpeg is not installed')
+    return np.frombuffer(result.stdout, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def decode_audio(data: bytes, sample_rate: int = None) -> AudioBuffer:
+    """
+    Decode an uploaded audio clip to mono float32 PCM in [-1, 1] at `sample_rate`
+    (Config.SAMPLE_RATE by default), entirely in memory.
+
+    Formats libsndfile reads are decoded in-process, and so is anything else
+    when PyAV is installed. Without it, other formats go through an ffmpeg pipe,
+    with at most Config.AUDIO_DECODER_CONCURRENCY running at once.
+    """
+    sample_rate = sample_rate or Config.SAMPLE_RATE
+    try:
+        samples = _decode_in_process(data, sample_rate)
+    except RuntimeError:  # soundfile's LibsndfileError: not a format libsndfile knows
+        if av is not None:
+            samples = _decode_with_av(data, sample_rate)
+        else:
+            samples = _decode_with_ffmpeg(data, sample_rate)
+    if samples.size == 0:
+        raise AudioDecodeError('Audio contains no samples')
+    return AudioBuffer(samples, sample_rate)
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    """LINEAR16 bytes for the Speech-to-Text API"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def as_audio_buffer(audio: Union[AudioBuffer, np.ndarray, str], sample_rate: int = None) -> AudioBuffer:
+    """
+    The AudioBuffer for a stage's input: buffers pass through untouched, bare
+    sample arrays are wrapped and file paths are read once.
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio
+    sample_rate = sample_rate or Config.SAMPLE_RATE
+    if isinstance(audio, np.ndarray):
+        return AudioBuffer(audio, sample_rate)
+    samples, source_rate = sf.read(audio, dtype='float32')
+    return AudioBuffer(resample(to_mono(samples), source_rate, sample_rate), sample_rate)
@@ -1,13 +1,62 @@
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, NamedTuple, Optional, Tuple, Union
 from datetime import datetime, timedelta
-from .database import Session, Room, Message
-from sqlalchemy import desc
+from . import database
+from .database import Session, Room, Message, SpeechMetricsRollup, SPEECH_METRIC_FIELDS, dialect_insert, run_write
+from .migrations import max_relevance
+from .write_behind import MessageWriteBehind
+from config import Config
+from sqlalchemy import String, cast, desc, func, insert, text, tuple_
+import base64
+import json
 import re
+import threading
+
+class MessageRow(NamedTuple):
+    """
+    Read-only copy of a message, returned by the history queries. Rows are plain
+    tuples, so they never enter a session's identity map and are freed as soon
+    as the caller drops them.
+    """
+    id: int
+    room_id: int
+    content: str
+    role: str
+    timestamp: datetime
+    max_relevance: Optional[float] = None
+    context: Optional[Dict] = None
+
+# Columns selected for MessageRow, in field order; `context` is appended when wanted
+MESSAGE_COLUMNS = (Message.id, Message.room_id, Message.content, Message.role,
+                   Message.timestamp, Message.max_relevance)
+
+def to_rows(results) -> List[MessageRow]:
+    return [MessageRow(*row) for row in results]
+
+def encode_cursor(message: MessageRow) -> str:
+    """Opaque pagination cursor for the (timestamp, id) position of a message"""
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except ValueError:  # Covers bad base64, UTF-8 and number formats
+        raise ValueError(f"Invalid cursor: {cursor}")
 
 class ChatManager:
-    def __init__(self, path: str):
+    def __init__(self, path: str, write_behind: bool = None):
         self.path = path
-        self.session = Session()
+        if write_behind is None:
+            write_behind = Config.MESSAGE_WRITE_BEHIND
+        # Optional buffering of add_message inserts into grouped transactions
+        self.write_behind = get_write_behind() if write_behind else None
+
+    @property
+    def session(self):
+        """The calling thread's session; it is discarded at the end of each request or job"""
+        return Session()
 
     def create_room(self, name: str, file_context: str = None, collection_name: str = None) -> Room:
         """Create a new chat room"""
@@ -17,33 +66,122 @@ class ChatManager:
             collection_name=collection_name,
             created_at=datetime.now()
         )
-        self.session.add(room)
-        self.session.commit()
-        return room
+
+        def apply():
+            self.session.add(room)
+            return room
+        return run_write(self.session, apply)
 
     def get_room(self, room_id: int) -> Optional[Room]:
         """Get a chat room by ID"""
         return self.session.query(Room).get(room_id)
 
-    def add_message(self, room_id: int, content: str, role: str, context: Dict = None) -> Message:
-        """Add a message to a chat room"""
-        room = self.get_room(room_id)
+    def add_message(self, room_id: int, content: str, role: str,
+                    context: Dict = None, immediate: bool = False) -> Union[Message, MessageRow]:
+        """Add a message to a chat room.
+
+        In write-behind mode the insert is queued and a MessageRow without an id
+        is returned; reads through any manager in the process flush the queue
+        first. With `immediate`, the queue is flushed and the message inserted
+        right away, for callers that need its id.
+        """
+        if content is None or role is None:
+            raise ValueError("Message content and role are required")
+        room = self.get_room(room_id)  # Usually an identity-map hit within a request
         if not room:
             raise ValueError(f"Room {room_id} not found")
 
+        if self.write_behind and not immediate:
+            row = MessageRow(
+                id=None,
+                room_id=room_id,
+                content=content,
+                role=role,
+                timestamp=datetime.now(),
+                max_relevance=max_relevance(context),
+                context=context
+            )
+            self.write_behind.add({field: value for field, value in row._asdict().items() if field != 'id'})
+            return row
+
         message = Message(
             room_id=room_id,
             content=content,
             role=role,
             timestamp=datetime.now(),
-            context=context
+            context=context,
+            max_relevance=max_relevance(context)
+        )
+
+        speech_metrics = context.get('speech_metrics') if role == 'user' and context else None
+
+        # Earlier queued messages keep their place ahead of this one
+        self.flush()
+
+        def apply():
+            self.session.add(message)
+            if speech_metrics:
+                # Same transaction as the message, so the rollups never drift from it
+                self._add_speech_metrics(room_id, speech_metrics, message.timestamp)
+            return message
+        return run_write(self.session, apply)
+
+    def _write_messages(self, rows: List[Dict]) -> None:
+        """Insert a batch of queued messages, and their speech metrics, in one transaction"""
+        def apply():
+            self.session.execute(insert(Message), rows)
+            for row in rows:
+                if row['role'] == 'user' and row['context'] and row['context'].get('speech_metrics'):
+                    self._add_speech_metrics(row['room_id'], row['context']['speech_metrics'], row['timestamp'])
+        run_write(self.session, apply)
+
+    def flush(self) -> None:
+        """Write any queued messages so that reads see them"""
+        if self.write_behind:
+            self.write_behind.flush()
+
+    def _add_speech_metrics(self, room_id: int, metrics: Dict, timestamp: datetime) -> None:
+        """Add one message's speech metrics to the room's all-time and daily rollups"""
+        values = {f'{field}_sum': metrics.get(field, 0) for field in SPEECH_METRIC_FIELDS}
+        statement = dialect_insert(SpeechMetricsRollup).values([
+            dict(room_id=room_id, period=period, count=1, **values)
+            for period in ('all', timestamp.date().isoformat())
+        ])
+        columns = ['count'] + list(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['room_id', 'period'],
+            set_={column: getattr(SpeechMetricsRollup, column) + getattr(statement.excluded, column)
+                  for column in columns}
         )
-        self.session.add(message)
-        self.session.commit()
-        return message
+        self.session.execute(statement)
+
+    def get_speech_rollups(self, room_id: int, start: str = None,
+                           end: str = None) -> List[SpeechMetricsRollup]:
+        """Get speech metric rollups for a room.
+
+        Args:
+            room_id: The room ID
+            start: First day (YYYY-MM-DD) of a range, inclusive
+            end: Last day (YYYY-MM-DD) of a range, inclusive
+
+        Returns:
+            The single all-time rollup when no range is given, otherwise the daily
+            rollups in the range ordered by day
+        """
+        self.flush()
+        query = self.session.query(SpeechMetricsRollup).filter(SpeechMetricsRollup.room_id == room_id)
+        if not start and not end:
+            return query.filter(SpeechMetricsRollup.period == 'all').all()
+
+        query = query.filter(SpeechMetricsRollup.period != 'all')
+        if start:
+            query = query.filter(SpeechMetricsRollup.period >= start)
+        if end:
+            query = query.filter(SpeechMetricsRollup.period <= end)
+        return query.order_by(SpeechMetricsRollup.period).all()
 
     def get_room_history(self, room_id: int, limit: int = None, 
-                        hours: int = None, relevance_threshold: float = 0.7) -> List[Message]:
+                        hours: int = None, relevance_threshold: float = 0.7) -> List[MessageRow]:
         """Get message history for a room with advanced filtering.
         
         Args:
@@ -55,44 +193,81 @@ class ChatManager:
         Returns:
             List of messages ordered by timestamp
         """
-        query = self.session.query(Message).filter(Message.room_id == room_id)
-        
+        self.flush()
+        filters = [Message.room_id == room_id]
         if hours:
             cutoff = datetime.now() - timedelta(hours=hours)
-            query = query.filter(Message.timestamp >= cutoff)
-            
-        # Order by timestamp
-        query = query.order_by(Message.timestamp)
-        
-        # Get all messages that match the criteria
-        messages = query.all()
-        
-        if not messages:
-            return []
-            
-        # If we have a limit, select messages intelligently
-        if limit and len(messages) > limit:
-            # Always include the most recent message
-            latest_msg = messages[-1]
-            
-            # Filter remaining messages by relevance
-            relevant_msgs = []
-            for msg in messages[:-1]:
-                # Check if message has context with relevance score
-                if msg.context and 'metadata' in msg.context:
-                    for meta in msg.context['metadata']:
-                        if meta.get('relevance_score', 0) >= relevance_threshold:
-                            relevant_msgs.append(msg)
-                            break
-                
-            # Add messages with high relevance scores
-            result = relevant_msgs[-limit+1:] + [latest_msg]
-            return sorted(result, key=lambda x: x.timestamp)
-            
-        return messages
+            filters.append(Message.timestamp >= cutoff)
+
+        def newest_first(*columns):
+            return self.session.query(*columns).filter(*filters).order_by(desc(Message.timestamp), desc(Message.id))
+
+        if not limit:
+            return to_rows(
+                self.session.query(*MESSAGE_COLUMNS, Message.context).filter(*filters)
+                .order_by(Message.timestamp, Message.id)
+            )
+
+        # One statement: rooms that fit within the limit come back whole, otherwise
+        # the most recent message plus the latest messages whose context scored at
+        # least the threshold. Both subqueries are uncorrelated, so they run once
+        # and read at most limit + 1 index entries.
+        probe = newest_first(Message.id).limit(limit + 1).subquery()
+        fits = self.session.query(func.count()).select_from(probe).scalar_subquery() <= limit
+        latest_id = newest_first(Message.id).limit(1).scalar_subquery()
+        selected = (
+            newest_first(*MESSAGE_COLUMNS, Message.context)
+            .filter(fits | (Message.id == latest_id) | (Message.max_relevance >= relevance_threshold))
+            .limit(limit)
+            .all()
+        )
+        return to_rows(reversed(selected))
 
-    def get_relevant_context(self, room_id: int, query: str, limit: int = 5) -> List[Message]:
+    def get_message_page(self, room_id: int, limit: int, before: str = None, after: str = None,
+                         include_context: bool = True) -> Tuple[List[MessageRow], Optional[str]]:
+        """Get one page of a room's messages using keyset pagination on (timestamp, id).
+
+        Without `after`, pages walk backwards from the newest message (or from the
+        `before` cursor); with `after`, they walk forwards from that cursor. Each
+        page is a single index range scan, however deep into the history it is.
+
+        Args:
+            room_id: The room ID
+            limit: Page size
+            before: Cursor of the message the page ends before
+            after: Cursor of the message the page starts after
+            include_context: Whether to load the JSON context column
+
+        Returns:
+            Tuple of (messages ordered by timestamp, cursor of the next page or None)
+        """
+        self.flush()
+        position = tuple_(Message.timestamp, Message.id)
+        columns = MESSAGE_COLUMNS + (Message.context,) if include_context else MESSAGE_COLUMNS
+        query = self.session.query(*columns).filter(Message.room_id == room_id)
+
+        if after:
+            query = query.filter(position > tuple_(*decode_cursor(after)))
+            query = query.order_by(Message.timestamp, Message.id)
+        else:
+            if before:
+                query = query.filter(position < tuple_(*decode_cursor(before)))
+            query = query.order_by(desc(Message.timestamp), desc(Message.id))
+
+        # One extra row tells us whether another page exists
+        messages = to_rows(query.limit(limit + 1))
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1]) if has_more else None
+        if not after:
+            messages.reverse()
+        return messages, next_cursor
+
+    def get_relevant_context(self, room_id: int, query: str, limit: int = 5) -> List[MessageRow]:
         """Get messages most relevant to the current query.
+
+        Uses the messages_fts full-text index when available and falls back to
+        scoring word overlap over the whole history otherwise.
         
         Args:
             room_id: The room ID
@@ -102,6 +277,13 @@ class ChatManager:
         Returns:
             List of most relevant messages
         """
+        self.flush()
+        query_words = set(re.findall(r'\w+', query.lower()))
+        if not query_words:
+            return []
+        if database.FTS_ENABLED:
+            return self._search_messages(room_id, query_words, limit)
+
         # Get all messages for the room
         messages = self.get_room_history(room_id)
         
@@ -110,7 +292,6 @@ class ChatManager:
             
         # Score messages based on simple keyword matching
         scored_messages = []
-        query_words = set(re.findall(r'\w+', query.lower()))
         
         for msg in messages:
             # Skip system messages
@@ -128,30 +309,137 @@ class ChatManager:
         scored_messages.sort(reverse=True, key=lambda x: x[0])
         return [msg for score, msg in scored_messages[:limit]]
 
+    def _search_messages(self, room_id: int, query_words: set, limit: int) -> List[MessageRow]:
+        """BM25-ranked full-text lookup of a room's messages containing any query word"""
+        terms = " OR ".join(f'"{word}"' for word in sorted(query_words))
+        columns = [attribute.expression for attribute in MESSAGE_COLUMNS + (Message.context,)]
+        statement = text(
+            f"SELECT {', '.join(f'messages.{column.name}' for column in columns)} FROM messages_fts "
+            "JOIN messages ON messages.id = messages_fts.rowid "
+            "WHERE messages_fts MATCH :match AND messages.role != 'system' "
+            # The room_id column only filters; it gets no weight in the ranking
+            "ORDER BY bm25(messages_fts, 1.0, 0.0) LIMIT :limit"
+        ).columns(*columns)  # Typed, so timestamps and JSON are decoded
+        return to_rows(self.session.execute(
+            statement,
+            {'match': f'room_id:"{int(room_id)}" AND ({terms})', 'limit': limit}
+        ))
+
+    def get_recently_active_rooms(self, limit: int = 5) -> List[Room]:
+        """Get rooms with a document collection, most recently messaged first"""
+        last_activity = func.max(Message.timestamp)
+        return (
+            self.session.query(Room)
+            .join(Message, Message.room_id == Room.id)
+            .filter(Room.collection_name.isnot(None))
+            .group_by(Room.id)
+            .order_by(desc(last_activity))
+            .limit(limit)
+            .all()
+        )
+
+    def compact_contexts(self, window: int, batch_size: int = 500) -> Dict[str, int]:
+        """Rewrite legacy contexts that embed the whole conversation as message id references.
+
+        Replies used to store every earlier message of the room as
+        `conversation_history`. That list was the room's history at the time, so the
+        first N messages of the room, where N is its length, are exactly the ones
+        it copied.
+
+        Args:
+            window: Number of preceding message ids to keep per reply
+            batch_size: Messages rewritten per transaction
+
+        Returns:
+            Counts of rewritten messages and context JSON bytes before and after
+        """
+        self.flush()
+        legacy = cast(Message.context, String).like('%"conversation_history"%')
+        stats = {'messages': 0, 'bytes_before': 0, 'bytes_after': 0}
+        room_ids = [room_id for (room_id,) in
+                    self.session.query(Message.room_id).filter(legacy).distinct().all()]
+
+        for room_id in room_ids:
+            ordered_ids = [message_id for (message_id,) in
+                           self.session.query(Message.id)
+                           .filter(Message.room_id == room_id)
+                           .order_by(Message.timestamp, Message.id)
+                           .all()]
+            last_id = 0
+            while True:
+                batch = (
+                    self.session.query(Message)
+                    .filter(Message.room_id == room_id, Message.id > last_id, legacy)
+                    .order_by(Message.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                def apply():
+                    bytes_before = bytes_after = 0
+                    for message in batch:
+                        context = dict(message.context)
+                        history_length = len(context.pop('conversation_history') or [])
+                        history_ids = ordered_ids[:history_length]
+                        context['history_message_ids'] = history_ids[-window:] if window else []
+                        bytes_before += len(json.dumps(message.context))
+                        bytes_after += len(json.dumps(context))
+                        message.context = context
+                    return bytes_before, bytes_after
+                bytes_before, bytes_after = run_write(self.session, apply)
+                self.session.expunge_all()  # Keep the identity map to one batch
+                stats['messages'] += len(batch)
+                stats['bytes_before'] += bytes_before
+                stats['bytes_after'] += bytes_after
+        return stats
+
     def list_rooms(self) -> List[Room]:
         """Get all chat rooms"""
         return self.session.query(Room).order_by(desc(Room.created_at)).all()
 
     def delete_room(self, room_id: int) -> bool:
         """Delete a chat room and all its messages"""
-        room = self.get_room(room_id)
-        if room:
-            self.session.delete(room)
-            self.session.commit()
-            return True
-        return False
+        self.flush()
+
+        def apply():
+            room = self.get_room(room_id)
+            if room:
+                self.session.delete(room)
+            return room is not None
+        return run_write(self.session, apply)
 
     def update_room(self, room_id: int, **kwargs) -> Optional[Room]:
         """Update room properties"""
-        room = self.get_room(room_id)
-        if room:
-            for key, value in kwargs.items():
-                if hasattr(room, key):
-                    setattr(room, key, value)
-            self.session.commit()
+        def apply():
+            room = self.get_room(room_id)
+            if room:
+                for key, value in kwargs.items():
+                    if hasattr(room, key):
+                        setattr(room, key, value)
             return room
-        return None
+        return run_write(self.session, apply) 
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
 
-    def __del__(self):
-        """Close the session when the manager is destroyed"""
-        self.session.close() 
\ No newline at end of file
+def get_write_behind() -> MessageWriteBehind:
+    """
+    The process-wide write-behind queue. Every ChatManager shares it, so a flush
+    from any of them (e.g. the routes' manager) also writes messages queued by
+    another (e.g. an ingestion job's), and there is only one flusher thread.
+    """
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                # Batches only use the calling thread's session, so any manager can write them
+                _write_behind = MessageWriteBehind(
+                    ChatManager('.', write_behind=False)._write_messages,
+                    flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+                    max_batch=Config.WRITE_BEHIND_MAX_BATCH,
+                    max_retries=Config.WRITE_BEHIND_MAX_RETRIES
+                )
+    return _write_behind
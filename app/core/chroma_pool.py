@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import chromadb
+from chromadb import EmbeddingFunction
+from chromadb.config import Settings
+
+from config import Config
+
+
+class ChromaCollectionPool:
+    """
+    Per-process registry of open Chroma clients and collection handles.
+
+    Opening a PersistentClient and re-reading a collection on every chat message
+    touches SQLite and the HNSW segment files each time. The pool keeps one client
+    per storage path and an LRU of collection handles, bounded by count. Segment
+    memory is bounded separately by Chroma's own LRU segment cache, configured
+    through the client settings.
+
+    Parameters:
+    - max_collections (int): Maximum number of collection handles kept open.
+    - memory_limit_bytes (int): Memory budget for Chroma's loaded segments.
+    """
+    def __init__(self, max_collections: int, memory_limit_bytes: int):
+        self.max_collections = max_collections
+        self.memory_limit_bytes = memory_limit_bytes
+        self._clients: Dict[str, chromadb.ClientAPI] = {}
+        self._collections: "OrderedDict[Tuple[str, str], chromadb.Collection]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _normalize_path(path: str) -> str:
+        return os.path.abspath(str(path).strip())
+
+    def get_client(self, path: str) -> chromadb.ClientAPI:
+        """Return the shared client for `path`, creating it on first use."""
+        path = self._normalize_path(path)
+        with self._lock:
+            client = self._clients.get(path)
+            if client is None:
+                client = chromadb.PersistentClient(
+                    path=path,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        chroma_segment_cache_policy="LRU",
+                        chroma_memory_limit_bytes=self.memory_limit_bytes
+                    )
+                )
+                self._clients[path] = client
+            return client
+
+    def get_collection(self, path: str, name: str,
+                       embedding_function_factory: Callable[[], EmbeddingFunction]) -> chromadb.Collection:
+        """Return a cached handle for collection `name`, opening it if needed."""
+        key = (self._normalize_path(path), name)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is not None:
+                self._collections.move_to_end(key)
+                return collection
+
+            collection = self.get_client(path).get_collection(
+                name=name,
+                embedding_function=embedding_function_factory()
+            )
+            self._collections[key] = collection
+            while len(self._collections) > self.max_collections:
+                self._collections.popitem(last=False)
+            return collection
+
+    def invalidate(self, path: str, name: str) -> None:
+        """Drop the cached handle for a collection that was replaced or deleted."""
+        with self._lock:
+            self._collections.pop((self._normalize_path(path), name), None)
+
+    def warm_up(self, path: str, names: Iterable[str],
+                embedding_function_factory: Callable[[], EmbeddingFunction]) -> None:
+        """Open the given collections and touch their vector segments."""
+        for name in names:
+            try:
+                collection = self.get_collection(path, name, embedding_function_factory)
+                # Reading an embedding forces the HNSW segment to load
+                collection.peek(limit=1)
+            except Exception as e:
+                print(f'Could not warm up collection {name}: {str(e)}')
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'collections': len(self._collections),
+                'max_collections': self.max_collections,
+                'memory_limit_bytes': self.memory_limit_bytes
+            }
+
+
+_pool: Optional[ChromaCollectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_chroma_pool() -> ChromaCollectionPool:
+    """Return the process-wide Chroma pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ChromaCollectionPool(
+                    max_collections=Config.CHROMA_POOL_MAX_COLLECTIONS,
+                    memory_limit_bytes=Config.CHROMA_POOL_MEMORY_LIMIT_BYTES
+                )
+    return _pool
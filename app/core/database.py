@@ -1,17 +1,145 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, JSON, DateTime
+from sqlalchemy import create_engine, inspect, event, Column, Integer, String, ForeignKey, JSON, DateTime, Float, Index, UniqueConstraint
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, scoped_session, sessionmaker
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, TypeVar
 from config import Config
+from .migrations import run_migrations, schema_lock
 
-# Create the engine
-db_path = os.path.join(Config.BASE_DIR, 'data', 'chat.db')
-engine = create_engine(f'sqlite:///{db_path}')
+T = TypeVar('T')
 
-# Create session factory
-Session = sessionmaker(bind=engine)
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; the rest trades fsyncs and memory for speed"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}')  # Negative means KiB
+    cursor.close()
+
+def create_db_engine(url: str):
+    """
+    Engine for the configured database. SQLite gets the WAL pragmas above;
+    server databases get a connection pool sized for several app nodes.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        sqlite_engine = create_engine(
+            url,
+            connect_args={
+                'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                'check_same_thread': False
+            }
+        )
+        event.listen(sqlite_engine, 'connect', set_sqlite_pragmas)
+        return sqlite_engine
+    return create_engine(
+        url,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING
+    )
+
+# Create the engine; no connection is opened until first use
+engine = create_db_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+# Thread-local session registry; call Session.remove() when a request or job ends
+Session = scoped_session(sessionmaker(bind=engine))
+
+def is_lock_error(error: OperationalError) -> bool:
+    """True for SQLite lock contention errors that are safe to retry"""
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+class CommitMetrics:
+    """Commit count and latency of this process's writes, for comparing write modes"""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.total_seconds = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.commits += 1
+            self.total_seconds += seconds
+            self._recent.append(seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            commits, total = self.commits, self.total_seconds
+
+        def percentile(q: float) -> Optional[float]:
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 3) if recent else None
+
+        return {
+            # With WAL and synchronous=NORMAL each commit is one WAL append; fsyncs
+            # happen at checkpoints, so commits bound the fsync count from above
+            'commits': commits,
+            'avg_commit_ms': round(total / commits * 1000, 3) if commits else None,
+            'p50_commit_ms': percentile(0.5),
+            'p95_commit_ms': percentile(0.95),
+            'max_commit_ms': round(recent[-1] * 1000, 3) if recent else None
+        }
+
+commit_metrics = CommitMetrics()
+
+def run_write(session, apply: Callable[[], T]) -> T:
+    """
+    Runs `apply` and commits, retrying with backoff when SQLite reports lock
+    contention. `apply` must (re)add everything it writes, since a rollback
+    discards pending objects.
+    """
+    for attempt in range(Config.DB_WRITE_RETRIES + 1):
+        try:
+            result = apply()
+            start = time.perf_counter()
+            session.commit()
+            commit_metrics.record(time.perf_counter() - start)
+            return result
+        except OperationalError as e:
+            session.rollback()
+            if attempt == Config.DB_WRITE_RETRIES or not is_lock_error(e):
+                raise
+            time.sleep(Config.DB_WRITE_RETRY_DELAY * (2 ** attempt))
+        except Exception:
+            # Never leave a half-applied write in the transaction for the next commit
+            session.rollback()
+            raise
+
+def dialect_insert(model):
+    """INSERT statement with on_conflict_do_update support for the configured backend"""
+    if engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def database_size() -> Optional[int]:
+    """Bytes on disk of a SQLite database and its write-ahead log; None for server databases"""
+    if engine.dialect.name != 'sqlite':
+        return None
+    db_path = engine.url.database
+    return sum(os.path.getsize(path) for path in (db_path, f'{db_path}-wal') if os.path.exists(path))
+
+def vacuum_database() -> None:
+    """Reclaim the space freed by large deletes or rewrites"""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name == 'sqlite':
+            # Checkpoint the WAL and rebuild the file so freed pages go back to the OS
+            conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.exec_driver_sql('VACUUM')
+            conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        elif engine.dialect.name == 'postgresql':
+            conn.exec_driver_sql('VACUUM ANALYZE messages')
 
 # Create base class for declarative models
 Base = declarative_base()
@@ -27,6 +155,8 @@ class Room(Base):
     
     # Relationship with messages
     messages = relationship("Message", back_populates="room", cascade="all, delete-orphan")
+    speech_rollups = relationship("SpeechMetricsRollup", cascade="all, delete-orphan")
+    ingest_jobs = relationship("IngestJob", cascade="all, delete-orphan")
 
 class Message(Base):
     __tablename__ = 'messages'
@@ -37,9 +167,63 @@ class Message(Base):
     role = Column(String, nullable=False)  # 'user' or 'assistant'
     timestamp = Column(DateTime, default=datetime.now)
     context = Column(JSON, nullable=True)  # For storing metadata, sources, etc.
+    max_relevance = Column(Float, nullable=True)  # Highest context['metadata'] relevance_score, if any
     
     # Relationship with room
     room = relationship("Room", back_populates="messages")
 
-# Create all tables
-Base.metadata.create_all(engine)
\ No newline at end of file
+    __table_args__ = (
+        # Keyset pagination and history reads walk a room's messages in (timestamp, id) order
+        Index('ix_messages_room_timestamp_id', 'room_id', 'timestamp', 'id'),
+        Index('ix_messages_room_relevance', 'room_id', 'max_relevance'),
+    )
+
+# Speech metrics summed by the rollups; each has a `<name>_sum` column
+SPEECH_METRIC_FIELDS = ('accuracy', 'fluency', 'pronunciation_accuracy', 'speech_quality')
+
+class SpeechMetricsRollup(Base):
+    """Running sums of a room's speech metrics, for all time and per day"""
+    __tablename__ = 'speech_metrics_rollups'
+
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
+    period = Column(String, nullable=False)  # 'all' or an ISO date (YYYY-MM-DD)
+    count = Column(Integer, nullable=False, default=0)
+    accuracy_sum = Column(Float, nullable=False, default=0.0)
+    fluency_sum = Column(Float, nullable=False, default=0.0)
+    pronunciation_accuracy_sum = Column(Float, nullable=False, default=0.0)
+    speech_quality_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint('room_id', 'period', name='uq_speech_rollup_room_period'),
+    )
+
+class IngestJob(Base):
+    __tablename__ = 'ingest_jobs'
+
+    id = Column(String, primary_key=True)  # uuid4 hex
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
+    filename = Column(String, nullable=False)  # Original upload name
+    file_path = Column(String, nullable=False)  # Saved document path
+    state = Column(String, nullable=False, default='queued')  # queued, running, succeeded, failed
+    total_pages = Column(Integer, nullable=True)
+    pages_extracted = Column(Integer, nullable=False, default=0)
+    chunks_embedded = Column(Integer, nullable=False, default=0)
+    collection_name = Column(String, nullable=True)  # Set once indexing finishes
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+# Set by init_db(); False on SQLite builds without FTS5 and on server databases (see migration 3)
+FTS_ENABLED = False
+
+def init_db() -> None:
+    """
+    Create missing tables and apply pending migrations; run once per process at
+    startup. Concurrent calls (one per gunicorn worker) take turns.
+    """
+    global FTS_ENABLED
+    with schema_lock(engine):
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+    FTS_ENABLED = inspect(engine).has_table('messages_fts')
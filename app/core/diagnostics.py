@@ -0,0 +1,73 @@
+import gc
+import os
+import resource
+import tracemalloc
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session as OrmSession
+
+from .database import Base, Session
+
+
+def start_memory_tracing(frames: int = 1) -> None:
+    """Start tracemalloc (once per process) so memory_report can list top allocators"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size in bytes, where /proc is available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_report(limit: int = 20) -> Dict:
+    """
+    Snapshot of process memory for soak tests. It includes RSS, the top
+    tracemalloc allocators by source line, the calling thread's session identity
+    map, and the ORM instances and sessions still alive anywhere in the process.
+    If every request releases its session, the last two stay flat over time.
+    """
+    report = {
+        'rss_bytes': current_rss(),
+        # ru_maxrss is in KiB on Linux
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'tracemalloc': None
+    }
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')
+        ])
+        report['tracemalloc'] = {
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'top': [{
+                'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_bytes': stat.size,
+                'count': stat.count
+            } for stat in snapshot.statistics('lineno')[:limit]]
+        }
+
+    identity_map = Session().identity_map
+    report['identity_map'] = {
+        'size': len(identity_map),
+        'by_class': dict(Counter(type(obj).__name__ for obj in identity_map.values()))
+    }
+
+    live_objects = Counter()
+    live_sessions = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, Base):
+            live_objects[type(obj).__name__] += 1
+        elif isinstance(obj, OrmSession):
+            live_sessions += 1
+    report['live_orm_objects'] = dict(live_objects)
+    report['live_sessions'] = live_sessions
+    return report
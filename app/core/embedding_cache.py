@@ -0,0 +1,197 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache for embedding vectors.
+
+    Vectors are keyed on a SHA-256 of (model, task_type, text) and stored as
+    float32 blobs in a local SQLite file, so identical chunks are embedded once
+    no matter which upload or room they come from. When the store grows past
+    `max_bytes`, the least recently used entries are evicted.
+
+    Lookups never write on their own: an entry's access time is refreshed at
+    most once per `touch_interval`, and those refreshes ride along with the next
+    put (or go out in one batch once enough have piled up). The store size is
+    kept as a running total, re-read from the file every `size_resync` seconds
+    to pick up what other worker processes added.
+
+    Parameters:
+    - path (str): Location of the SQLite cache file.
+    - max_bytes (int): Upper bound on the total size of cached vectors.
+    - touch_interval (float): Seconds before a hit refreshes an entry's access time.
+    - size_resync (float): Seconds between re-reading the total size from the file.
+    """
+    # Pending access-time refreshes that force a write even without a put
+    MAX_PENDING_TOUCHES = 1000
+
+    def __init__(self, path: str, max_bytes: int, touch_interval: float = 3600, size_resync: float = 60):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.size_resync = size_resync
+        self._pending_touches: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+        self._sync_size()
+
+    def _sync_size(self) -> None:
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        self._size_synced_at = time.monotonic()
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        """Content address of a single (model, task_type, text) triple."""
+        digest = hashlib.sha256()
+        for part in (model, task_type, text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for `keys`; missing keys are left out."""
+        if not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob, last_access in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    if now - last_access > self.touch_interval:
+                        self._pending_touches[key] = now
+            if len(self._pending_touches) >= self.MAX_PENDING_TOUCHES:
+                self._write_touches()
+                self._conn.commit()
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        """Store vectors and evict the oldest entries if the cache is over budget."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            # Keys are content addresses, so an existing key already holds this vector
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            if self._conn.total_changes - before == len(rows):
+                self._size += sum(row[2] for row in rows)
+            else:
+                # Some were cached already (two workers embedding the same text); rare, so re-read
+                self._sync_size()
+            self._write_touches()
+            self._conn.commit()
+            self._evict()
+
+    def _write_touches(self) -> None:
+        if self._pending_touches:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(when, key) for key, when in self._pending_touches.items()]
+            )
+            self._pending_touches.clear()
+
+    def _evict(self) -> None:
+        if time.monotonic() - self._size_synced_at > self.size_resync:
+            self._sync_size()
+        if self._size <= self.max_bytes:
+            return
+        # Confirm against the file before deleting; other workers may have evicted already
+        self._sync_size()
+        if self._size <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so we don't evict on every insert
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY last_access"
+        ):
+            if self._size - freed <= target:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self._conn.commit()
+        self._size -= freed
+        self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process plus the current store size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'size_bytes': size,
+                'max_bytes': self.max_bytes
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when it is disabled."""
+    global _cache
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=Config.EMBEDDING_CACHE_PATH,
+                    max_bytes=Config.EMBEDDING_CACHE_MAX_BYTES,
+                    touch_interval=Config.EMBEDDING_CACHE_TOUCH_INTERVAL,
+                    size_resync=Config.EMBEDDING_CACHE_SIZE_RESYNC
+                )
+    return _cache
@@ -1,68 +1,251 @@
 from pypdf import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import multiprocessing
 import re
-from typing import List, Optional
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from config import Config
 
-def load_pdf(file_path: str) -> str:
+class Chunk(NamedTuple):
+    """
+    A chunk of document text, its character span [start, end) in the extracted
+    document and the pages it came from (1-based, when known).
+    """
+    text: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+
+def _clean_text(text: str) -> str:
+    """Collapse all whitespace runs to single spaces."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extracts pages [start, end) in a worker process."""
+    reader = PdfReader(file_path)
+    return [_clean_text(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def iter_pdf_pages(file_path: str, workers: Optional[int] = None,
+                   progress_callback: Optional[Callable[[int, int], None]] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yields (page_number, cleaned_text) for every page of a PDF, in order.
+
+    Large PDFs are split into page ranges that are extracted on a process pool.
+    Only a bounded window of ranges is in flight at once, so memory is bounded by
+    that window rather than by the size of the document.
+
+    Parameters:
+    - file_path (str): The file path to the PDF file.
+    - workers (int, optional): Extraction processes; defaults to Config.PDF_EXTRACT_WORKERS.
+    - progress_callback (callable, optional): Called with (pages_extracted, total_pages)
+      after each page.
+    """
+    reader = PdfReader(file_path)
+    total_pages = len(reader.pages)
+    workers = workers or Config.PDF_EXTRACT_WORKERS
+
+    if workers <= 1 or total_pages < Config.PDF_PARALLEL_MIN_PAGES:
+        for page_number, page in enumerate(reader.pages, start=1):
+            text = _clean_text(page.extract_text() or "")
+            if progress_callback:
+                progress_callback(page_number, total_pages)
+            yield page_number, text
+        return
+
+    span = Config.PDF_PAGES_PER_TASK
+    ranges = iter([(start, min(start + span, total_pages)) for start in range(0, total_pages, span)])
+    # Spawned workers: forking a threaded server process is not safe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+
+        def submit_next() -> None:
+            page_range = next(ranges, None)
+            if page_range:
+                pending.append((page_range[0], executor.submit(_extract_page_range, file_path, *page_range)))
+
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            start, future = pending.popleft()
+            texts = future.result()
+            submit_next()
+            for offset, text in enumerate(texts):
+                page_number = start + offset + 1
+                if progress_callback:
+                    progress_callback(page_number, total_pages)
+                yield page_number, text
+
+def load_pdf(file_path: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
     """
     Reads the text content from a PDF file and returns it as a single string.
 
     Parameters:
     - file_path (str): The file path to the PDF file.
+    - progress_callback (callable, optional): Called with (pages_extracted, total_pages)
+      after each page.
 
     Returns:
     - str: The concatenated text content of all pages in the PDF.
     """
-    # Logic to read pdf
-    reader = PdfReader(file_path)
+    return " ".join(
+        text for _, text in iter_pdf_pages(file_path, progress_callback=progress_callback) if text
+    )
 
-    # Loop over each page and store it in a variable
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n\n"
+def _finish_chunk(chunk: str) -> Optional[str]:
+    """Strips a chunk and makes sure it ends with punctuation; None for empty chunks."""
+    chunk = chunk.strip()
+    if not chunk:  # Skip empty chunks
+        return None
 
-    # Clean up the text
-    text = re.sub(r'\s+', ' ', text)  # Replace multiple spaces with single space
-    text = re.sub(r'\n\s*\n', '\n\n', text)  # Normalize line breaks
-    
-    return text.strip()
+    # Ensure chunk ends with proper punctuation
+    if not chunk[-1] in '.!?':
+        chunk += '.'
+    return chunk
+
+# Split points tried in order of preference; a chunk ends right after the separator
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+# Approximate LLM tokens: words and individual punctuation marks
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def _token_starts(text: str, pos: int, limit: int) -> List[int]:
+    """Start offsets of up to `limit` tokens in `text` from `pos` onwards."""
+    starts = []
+    for match in TOKEN_PATTERN.finditer(text, pos):
+        starts.append(match.start())
+        if len(starts) == limit:
+            break
+    return starts
 
-def split_text(text: str, chunk_size: int = 500, chunk_overlap: int = 50) -> List[str]:
+def iter_chunks(pages: Iterable[Tuple[int, str]], chunk_size: Optional[int] = None,
+                chunk_overlap: Optional[int] = None, unit: Optional[str] = None) -> Iterator[Chunk]:
     """
-    Splits text into semantically meaningful chunks using LangChain's RecursiveCharacterTextSplitter.
+    Single-pass chunker over a stream of (page_number, text) pairs.
+
+    The pages are treated as one document (joined with single spaces) and chunks
+    are cut at the best separator in the second half of each size window, so every
+    character is scanned a bounded number of times. Each Chunk carries its character
+    offsets in that document and the page range it spans. Only the text not yet
+    emitted is buffered.
+
+    Parameters:
+    - pages (iterable): (page_number, text) pairs in document order
+    - chunk_size (int, optional): Maximum chunk size; defaults to Config.CHUNK_SIZE
+    - chunk_overlap (int, optional): Overlap between chunks, at most half of each emitted
+      chunk; defaults to Config.CHUNK_OVERLAP
+    - unit (str, optional): 'chars' or 'tokens' (approximate); defaults to Config.CHUNK_UNIT
+    """
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    chunk_overlap = Config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    unit = unit or Config.CHUNK_UNIT
+    if unit not in ('chars', 'tokens'):
+        raise ValueError(f"Unknown chunk unit: {unit}")
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    buffer = ""
+    base = 0  # Document offset of buffer[0]
+    head = 0  # Buffer offset where the next chunk starts
+    page_offsets: List[int] = []  # Document offset where each buffered page begins
+    page_numbers: List[int] = []
+
+    def page_at(offset: int) -> int:
+        return page_numbers[max(0, bisect_right(page_offsets, offset) - 1)]
+
+    def next_cut() -> Optional[Tuple[int, int, Optional[List[int]]]]:
+        """(end, limit_end, token_starts) of the chunk at `head`, or None if more text is needed."""
+        if unit == 'chars':
+            limit_end = head + chunk_size
+            return (limit_end, limit_end, None) if limit_end < len(buffer) else None
+        token_starts = _token_starts(buffer, head, chunk_size + 1)
+        if len(token_starts) <= chunk_size:
+            return None
+        return token_starts[chunk_size], token_starts[chunk_size], token_starts
+
+    def emit(end: int) -> Optional[Chunk]:
+        raw = buffer[head:end]
+        text = _finish_chunk(raw)
+        if not text:
+            return None
+        start_offset = base + head + len(raw) - len(raw.lstrip())
+        end_offset = base + head + len(raw.rstrip())
+        return Chunk(text, start_offset, end_offset, page_at(start_offset), page_at(end_offset - 1))
+
+    def cut(final: bool) -> Iterator[Chunk]:
+        nonlocal buffer, base, head, page_offsets, page_numbers
+        while True:
+            window = next_cut()
+            if window is None:
+                break
+            end, limit_end, token_starts = window
+
+            # Best separator in the second half of the window, else a hard cut
+            window_start = head + (limit_end - head) // 2
+            for separator in SEPARATORS:
+                found = buffer.rfind(separator, window_start, limit_end)
+                if found != -1:
+                    end = found + len(separator)
+                    break
+
+            chunk = emit(end)
+            if chunk:
+                yield chunk
+
+            # Step back by the overlap, snapped forward to a word boundary. The overlap is
+            # capped at half of the emitted chunk, so a chunk cut short at a separator
+            # never makes the next one start only a few characters further on.
+            if unit == 'chars':
+                next_head = max(end - chunk_overlap, head + (end - head) // 2, head + 1)
+                if 0 < next_head < end and not buffer[next_head - 1].isspace():
+                    space = buffer.find(" ", next_head, end)
+                    next_head = space + 1 if space != -1 else end
+            else:
+                inside = [offset for offset in token_starts if offset < end]
+                step_back = min(chunk_overlap, len(inside) // 2)
+                next_head = inside[len(inside) - step_back] if step_back > 0 else end
+            head = max(next_head, head + 1)
+
+        if final:
+            if head < len(buffer):
+                chunk = emit(len(buffer))
+                if chunk:
+                    yield chunk
+            return
+
+        # Drop the consumed prefix once per page, so buffering stays linear
+        base += head
+        buffer = buffer[head:]
+        head = 0
+        first_page = max(0, bisect_right(page_offsets, base) - 1)
+        page_offsets = page_offsets[first_page:]
+        page_numbers = page_numbers[first_page:]
+
+    for page_number, text in pages:
+        if not text:
+            continue
+        if buffer or base:
+            buffer += " "
+        page_offsets.append(base + len(buffer))
+        page_numbers.append(page_number)
+        buffer += text
+        yield from cut(final=False)
+
+    yield from cut(final=True)
+
+def split_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[str]:
+    """
+    Splits text into chunks, preferring paragraph, line, sentence and word boundaries.
     
     Parameters:
     - text (str): The input text to be split
-    - chunk_size (int): Maximum size of each text chunk
-    - chunk_overlap (int): Number of characters to overlap between chunks
+    - chunk_size (int, optional): Maximum size of each text chunk; defaults to Config.CHUNK_SIZE
+    - chunk_overlap (int, optional): Number of characters to overlap between chunks;
+      defaults to Config.CHUNK_OVERLAP
     
     Returns:
     - List[str]: List of text chunks
     """
-    # Create text splitter with optimized settings
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""],
-        is_separator_regex=False
-    )
-    
-    # Split text into chunks
-    chunks = text_splitter.split_text(text)
-    
-    # Post-process chunks
-    processed_chunks = []
-    for chunk in chunks:
-        # Clean up chunk
-        chunk = chunk.strip()
-        if not chunk:  # Skip empty chunks
-            continue
-            
-        # Ensure chunk ends with proper punctuation
-        if not chunk[-1] in '.!?':
-            chunk += '.'
-            
-        processed_chunks.append(chunk)
-    
-    return processed_chunks
+    return [chunk.text for chunk in iter_chunks([(1, text)], chunk_size, chunk_overlap)]
@@ -0,0 +1,210 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from config import Config
+from .chat_room import ChatManager
+from .database import IngestJob, Session, run_write
+from .file_extractor import iter_chunks, iter_pdf_pages
+from .rag import create_chroma_db, delete_chroma_collection
+
+# Local worker pool that runs document ingestion off the request path
+_executor = ThreadPoolExecutor(max_workers=Config.INGEST_WORKERS, thread_name_prefix='ingest')
+
+
+def job_to_dict(job: IngestJob) -> Dict[str, Any]:
+    """Serialize an ingestion job for the status endpoint."""
+    return {
+        'id': job.id,
+        'room_id': job.room_id,
+        'filename': job.filename,
+        'state': job.state,
+        'total_pages': job.total_pages,
+        'pages_extracted': job.pages_extracted,
+        'chunks_embedded': job.chunks_embedded,
+        'collection_name': job.collection_name,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None
+    }
+
+
+def enqueue_ingest_job(chat_manager: ChatManager, room_id: int, file_path: str, filename: str) -> IngestJob:
+    """
+    Records a queued ingestion job and hands it to the background worker pool.
+
+    Args:
+        chat_manager: Manager whose session is used to record the job
+        room_id: Room the document belongs to
+        file_path: Path of the saved upload
+        filename: Original name of the uploaded file
+
+    Returns:
+        The newly created job
+    """
+    job = IngestJob(
+        id=uuid.uuid4().hex,
+        room_id=room_id,
+        filename=filename,
+        file_path=file_path,
+        state='queued'
+    )
+    def apply():
+        chat_manager.session.add(job)
+    run_write(chat_manager.session, apply)
+    _executor.submit(run_ingest_job, job.id)
+    return job
+
+
+def get_ingest_job(chat_manager: ChatManager, job_id: str) -> Optional[IngestJob]:
+    """
+    Get an ingestion job by ID, refreshed from the database. Polling an
+    unfinished job that stopped making progress runs the stale-job sweep, so a
+    client never waits on a job whose worker died.
+    """
+    # The worker updates the row from another session, so never trust the identity map here
+    job = chat_manager.session.get(IngestJob, job_id, populate_existing=True)
+    if job and job.state in ('queued', 'running') and is_stale(job):
+        recover_ingest_jobs(chat_manager)
+        job = chat_manager.session.get(IngestJob, job_id, populate_existing=True)
+    return job
+
+
+def is_stale(job: IngestJob) -> bool:
+    cutoff = datetime.now() - timedelta(seconds=Config.INGEST_STALE_AFTER)
+    return job.updated_at is not None and job.updated_at < cutoff
+
+
+def recover_ingest_jobs(chat_manager: ChatManager) -> Dict[str, int]:
+    """
+    Picks up jobs orphaned by a worker that was recycled, redeployed or crashed.
+    Run at worker boot, and by get_ingest_job when a polled job looks stale.
+
+    Jobs lived only in that worker's thread pool, so a `queued` row untouched for
+    Config.INGEST_STALE_AFTER seconds is submitted again. The claim in
+    run_ingest_job keeps it from running twice. A `running` row that old stopped
+    reporting progress and is marked failed.
+
+    Returns:
+        Counts of requeued and failed jobs
+    """
+    session = chat_manager.session
+    now = datetime.now()
+    cutoff = now - timedelta(seconds=Config.INGEST_STALE_AFTER)
+
+    failed = run_write(session, lambda: session.query(IngestJob).filter(
+        IngestJob.state == 'running',
+        IngestJob.updated_at < cutoff
+    ).update({
+        'state': 'failed',
+        'error': 'The worker processing this document stopped before it finished; please upload it again',
+        'updated_at': now
+    }, synchronize_session=False))
+
+    stale = [job_id for (job_id,) in session.query(IngestJob.id).filter(
+        IngestJob.state == 'queued',
+        IngestJob.updated_at < cutoff
+    )]
+    for job_id in stale:
+        _executor.submit(run_ingest_job, job_id)
+
+    if failed or stale:
+        print(f'Recovered ingestion jobs: {len(stale)} requeued, {failed} marked failed')
+    return {'requeued': len(stale), 'failed': failed}
+
+
+def run_ingest_job(job_id: str) -> None:
+    """
+    Extracts, chunks and indexes a queued document, recording progress on the job row.
+
+    The room's collection_name is only switched over in the final commit, so chats
+    keep using the previous collection until the new one is fully built.
+    """
+    # The worker thread gets its own thread-local session
+    manager = ChatManager(os.path.join(Config.BASE_DIR, 'data', 'chat_rooms'))
+    session = manager.session
+    try:
+        # Claim the job so it can only ever run once
+        claimed = run_write(session, lambda: session.query(IngestJob).filter(
+            IngestJob.id == job_id,
+            IngestJob.state == 'queued'
+        ).update({'state': 'running', 'updated_at': datetime.now()}))
+        if not claimed:
+            return
+
+        job = session.get(IngestJob, job_id)
+
+        # Progress not yet written; flushed at most every INGEST_PROGRESS_INTERVAL
+        # seconds so a long document doesn't compete with chat writes page by page
+        progress = {}
+        last_progress_write = time.monotonic()
+
+        def update_job(**fields) -> None:
+            fields = {**progress, **fields}
+            progress.clear()
+            def apply():
+                for key, value in fields.items():
+                    setattr(job, key, value)
+            run_write(session, apply)
+
+        def report_progress(**fields) -> None:
+            nonlocal last_progress_write
+            progress.update(fields)
+            if time.monotonic() - last_progress_write >= Config.INGEST_PROGRESS_INTERVAL:
+                update_job()
+                last_progress_write = time.monotonic()
+
+        try:
+            # Pages stream through chunking straight into the embedding pipeline
+            chunks = iter_chunks(iter_pdf_pages(
+                job.file_path,
+                progress_callback=lambda pages, total: report_progress(pages_extracted=pages, total_pages=total)
+            ))
+
+            collection_name = f"collection_{job.room_id}_{job.id}"
+            create_chroma_db(
+                documents=chunks,
+                path=Config.VECTOR_STORE_DIR,
+                name=collection_name,
+                progress_callback=lambda chunks_embedded: report_progress(chunks_embedded=chunks_embedded)
+            )
+
+            # Swap the room over to the new collection in the same commit that finishes the job
+            previous_collection = manager.get_room(job.room_id).collection_name
+            final_progress = dict(progress)
+
+            def swap():
+                for key, value in final_progress.items():
+                    setattr(job, key, value)
+                job.state = 'succeeded'
+                job.collection_name = collection_name
+                room = manager.get_room(job.room_id)
+                room.file_context = job.file_path
+                room.collection_name = collection_name
+            run_write(session, swap)
+            progress.clear()
+            if previous_collection and previous_collection != collection_name:
+                # Nothing reads the old index once the room points at the new one
+                delete_chroma_collection(Config.VECTOR_STORE_DIR, previous_collection)
+
+            manager.add_message(
+                room_id=job.room_id,
+                content=f"Document processed successfully! You can now ask questions about {job.filename}",
+                role="system"
+            )
+        except Exception as e:
+            print(f'Error processing file: {str(e)}')
+            session.rollback()
+            update_job(state='failed', error=str(e))
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            manager.add_message(
+                room_id=job.room_id,
+                content=f"Error processing {job.filename}: {str(e)}",
+                role="system"
+            )
+    finally:
+        Session.remove()
@@ -1,43 +1,115 @@
-import parselmouth
-import numpy as np
-import app.core.tts as tts
-import wave
-import tempfile
-import soundfile as sf
-
-def pitch(input_words, audio_path):
-    try:
-        # First try to load with soundfile to handle different formats
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-            # Read audio data and resample if necessary
-            data, samplerate = sf.read(audio_path)
-            # Write as WAV with proper headers
-            sf.write(temp_wav.name, data, samplerate, format='WAV', subtype='PCM_16')
-            
-            # Now analyze with Parselmouth
-            sound = parselmouth.Sound(temp_wav.name)
-            pitch_obj = sound.to_pitch()
-            pitch_values = pitch_obj.selected_array['frequency']
-            pitch = [x for x in pitch_values if x != 0]
-
-            # Handle case where we have more words than pitch values or vice versa
-            min_len = min(len(input_words), len(pitch))
-            per_word_pitch = []
-            
-            for i in range(min_len):
-                per_word_pitch.append(f'{input_words[i]}: {pitch[i]:.2f} Hz')
-            
-            # If we have more words than pitch values, add placeholder values
-            for i in range(min_len, len(input_words)):
-                per_word_pitch.append(f'{input_words[i]}: N/A')
-            
-            # Calculate overall pitch from valid values
-            overall_average_pitch = np.mean(pitch) if pitch else 0
-
-            return per_word_pitch, overall_average_pitch
-
-    except Exception as e:
-        print(f"Error in pitch analysis: {str(e)}")
-        # Return placeholder values if analysis fails
-        per_word_pitch = [f'{word}: N/A' for word in input_words]
-        return per_word_pitch, 0
\ No newline at end of file
+import parselmouth
+import numpy as np
+from typing import Dict, List, Tuple
+from app.core.audio import as_audio_buffer
+
+def empty_word_pitch(word) -> Dict:
+    """Pitch entry for a word with no voiced frames (or when analysis failed)"""
+    return {
+        'word': word.word,
+        'start': round(word.start, 3),
+        'end': round(word.end, 3),
+        'mean_hz': None,
+        'min_hz': None,
+        'max_hz': None,
+        'range_hz': None,
+        'slope_hz_per_s': None,
+        'voiced_frames': 0
+    }
+
+def word_pitch_stats(times: np.ndarray, frequencies: np.ndarray, words) -> List[Dict]:
+    """
+    Mean, range and least-squares contour slope of the voiced pitch frames
+    inside each word's [start, end] span.
+
+    Frames are located with searchsorted, and sums come from prefix sums, so
+    the cost is O(frames + words) whatever the clip length.
+
+    Args:
+        times: Frame times in seconds, ascending
+        frequencies: F0 per frame in Hz, 0 where unvoiced
+        words: Objects with word, start and end (stt.RecognizedWord)
+    """
+    if not words:
+        return []
+    voiced = frequencies > 0
+    t = times[voiced]
+    f = frequencies[voiced]
+
+    starts = np.fromiter((w.start for w in words), dtype=np.float64, count=len(words))
+    ends = np.fromiter((w.end for w in words), dtype=np.float64, count=len(words))
+    lo = np.searchsorted(t, starts, side='left')
+    hi = np.searchsorted(t, ends, side='right')
+    n = hi - lo
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        return prefix[hi] - prefix[lo]
+
+    sum_f = window_sums(f)
+    sum_t = window_sums(t)
+    sum_tf = window_sums(t * f)
+    sum_tt = window_sums(t * t)
+
+    has_frames = n > 0
+    mean = np.divide(sum_f, n, out=np.zeros_like(sum_f), where=has_frames)
+    denominator = n * sum_tt - sum_t * sum_t
+    has_slope = (n > 1) & (denominator > 1e-12)
+    slope = np.divide(n * sum_tf - sum_t * sum_f, denominator, out=np.zeros_like(sum_f), where=has_slope)
+
+    # Min and max over each [lo, hi) window: reduceat on interleaved bounds, keeping the even slots.
+    # The padding makes hi == len(f) a valid index.
+    bounds = np.column_stack((lo[has_frames], hi[has_frames])).ravel()
+    padded = np.append(f, 0.0)
+    minimum = np.zeros(len(words))
+    maximum = np.zeros(len(words))
+    if bounds.size:
+        minimum[has_frames] = np.minimum.reduceat(padded, bounds)[::2]
+        maximum[has_frames] = np.maximum.reduceat(padded, bounds)[::2]
+
+    per_word = []
+    for i, word in enumerate(words):
+        if not has_frames[i]:
+            per_word.append(empty_word_pitch(word))
+            continue
+        per_word.append({
+            'word': word.word,
+            'start': round(word.start, 3),
+            'end': round(word.end, 3),
+            'mean_hz': round(float(mean[i]), 2),
+            'min_hz': round(float(minimum[i]), 2),
+            'max_hz': round(float(maximum[i]), 2),
+            'range_hz': round(float(maximum[i] - minimum[i]), 2),
+            'slope_hz_per_s': round(float(slope[i]), 2) if has_slope[i] else None,
+            'voiced_frames': int(n[i])
+        })
+    return per_word
+
+def pitch(words, audio) -> Tuple[List[Dict], float]:
+    """
+    Per-word and overall pitch of a clip.
+
+    Args:
+        words: Recognized words with time offsets (stt.RecognizedWord), in seconds into the upload
+        audio: The decoded AudioBuffer, or a path to an audio file
+
+    Returns:
+        Tuple of (per-word pitch dicts, mean F0 in Hz over all voiced frames)
+    """
+    try:
+        # Analyze the samples with Parselmouth directly, no WAV round trip
+        audio = as_audio_buffer(audio)
+        sound = parselmouth.Sound(audio.samples.astype(np.float64), sampling_frequency=audio.sample_rate)
+        pitch_obj = sound.to_pitch()
+        # Shift frame times onto the same timeline as the word offsets
+        times = pitch_obj.xs() + audio.offset
+        frequencies = pitch_obj.selected_array['frequency']
+
+        voiced = frequencies[frequencies > 0]
+        overall_average_pitch = float(voiced.mean()) if voiced.size else 0.0
+        return word_pitch_stats(times, frequencies, words), overall_average_pitch
+
+    except Exception as e:
+        print(f"Error in pitch analysis: {str(e)}")
+        # Return placeholder values if analysis fails
+        return [empty_word_pitch(word) for word in words], 0.0
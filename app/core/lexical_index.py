@@ -0,0 +1,179 @@
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, shared by indexing and querying."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Immutable BM25 inverted index over the chunks of one collection.
+
+    Postings are stored as flat NumPy arrays (CSR layout): the postings of term t
+    live in `postings_docs[term_offsets[t]:term_offsets[t + 1]]`, with matching term
+    frequencies in `postings_tfs`. Scoring a query only touches the postings of its
+    terms, so thousands of chunks are scored in well under a millisecond.
+    """
+    def __init__(self, doc_ids: np.ndarray, doc_lengths: np.ndarray, terms: np.ndarray,
+                 term_offsets: np.ndarray, postings_docs: np.ndarray, postings_tfs: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.k1 = k1
+        self.b = b
+
+        self.vocabulary = {term: i for i, term in enumerate(terms.tolist())}
+        n_docs = len(doc_ids)
+        doc_freqs = np.diff(term_offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # Per-document length normalisation, precomputed once
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / avg_length)).astype(np.float32) \
+            if avg_length else np.full(n_docs, k1, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def term_ids(self, query: str) -> List[int]:
+        """Vocabulary ids of the distinct query terms that occur in the index."""
+        return [self.vocabulary[term] for term in dict.fromkeys(tokenize(query)) if term in self.vocabulary]
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every document for `query`."""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term_id in self.term_ids(query):
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tfs = self.postings_tfs[start:end]
+            scores[docs] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self.length_norm[docs])
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Top `top_k` (doc_id, score) pairs with a positive score, best first."""
+        scores = self.score(query)
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        if matched.size > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(str(self.doc_ids[i]), float(scores[i])) for i in matched]
+
+    def save(self, path: str) -> None:
+        """Persist the index atomically next to its Chroma collection."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                doc_ids=self.doc_ids,
+                doc_lengths=self.doc_lengths,
+                terms=self.terms,
+                term_offsets=self.term_offsets,
+                postings_docs=self.postings_docs,
+                postings_tfs=self.postings_tfs
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                doc_ids=data['doc_ids'],
+                doc_lengths=data['doc_lengths'],
+                terms=data['terms'],
+                term_offsets=data['term_offsets'],
+                postings_docs=data['postings_docs'],
+                postings_tfs=data['postings_tfs']
+            )
+
+
+class BM25IndexBuilder:
+    """Accumulates chunks during ingestion and produces a BM25Index."""
+    def __init__(self):
+        self._doc_ids: List[str] = []
+        self._doc_lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+
+    def add(self, doc_id: str, text: str, tokens: Optional[List[str]] = None) -> None:
+        """Index one chunk; pass `tokens` if the text was already tokenized."""
+        row = len(self._doc_ids)
+        if tokens is None:
+            tokens = tokenize(text)
+        self._doc_ids.append(doc_id)
+        self._doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self._postings.setdefault(term, []).append((row, tf))
+
+    def build(self) -> BM25Index:
+        terms = sorted(self._postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        postings_docs = []
+        postings_tfs = []
+        for i, term in enumerate(terms):
+            postings = self._postings[term]
+            term_offsets[i + 1] = term_offsets[i] + len(postings)
+            postings_docs.extend(row for row, _ in postings)
+            postings_tfs.extend(tf for _, tf in postings)
+        return BM25Index(
+            doc_ids=np.array(self._doc_ids, dtype=str),
+            doc_lengths=np.array(self._doc_lengths, dtype=np.float32),
+            terms=np.array(terms, dtype=str),
+            term_offsets=term_offsets,
+            postings_docs=np.array(postings_docs, dtype=np.int32),
+            postings_tfs=np.array(postings_tfs, dtype=np.float32)
+        )
+
+
+def lexical_index_path(store_path: str, name: str) -> str:
+    """Location of a collection's BM25 index inside the vector store directory."""
+    return os.path.join(str(store_path).strip(), 'lexical', f"{name}.npz")
+
+
+_loaded: "OrderedDict[str, BM25Index]" = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def load_lexical_index(store_path: str, name: str) -> Optional[BM25Index]:
+    """
+    Returns the BM25 index for a collection, or None for collections that were
+    built before lexical indexing existed. Loaded indexes are kept in a small LRU.
+    """
+    path = lexical_index_path(store_path, name)
+    with _loaded_lock:
+        index = _loaded.get(path)
+        if index is not None:
+            _loaded.move_to_end(path)
+            return index
+    if not os.path.exists(path):
+        return None
+    index = BM25Index.load(path)
+    with _loaded_lock:
+        _loaded[path] = index
+        while len(_loaded) > Config.CHROMA_POOL_MAX_COLLECTIONS:
+            _loaded.popitem(last=False)
+    return index
+
+
+def delete_lexical_index(store_path: str, name: str) -> None:
+    """Remove a collection's BM25 index from disk and from the in-process cache."""
+    path = lexical_index_path(store_path, name)
+    with _loaded_lock:
+        _loaded.pop(path, None)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,202 @@
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DatabaseError, OperationalError
+
+try:
+    import fcntl
+except ImportError:  # Windows; schema setup there is not serialized across processes
+    fcntl = None
+
+# Ordered schema migrations for databases created before a change to the models.
+# Every gunicorn worker calls init_db at boot, so init_db holds schema_lock while
+# creating tables and applying these; each one runs once, in its own transaction.
+# A migration must still be safe to re-run after a crash part-way through (create
+# objects with execute_ddl or IF NOT EXISTS, recompute rather than increment) and
+# portable across SQLite and PostgreSQL unless it checks the dialect.
+MIGRATIONS: List[Tuple[int, str, Callable]] = []
+
+# Arbitrary application-wide key for the PostgreSQL advisory lock
+SCHEMA_LOCK_KEY = 7305186421
+
+@contextmanager
+def schema_lock(engine) -> Iterator[None]:
+    """
+    Serializes schema setup across processes: an advisory lock on PostgreSQL, a
+    file lock next to the database file on SQLite. Other databases are not locked.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': SCHEMA_LOCK_KEY})
+                conn.commit()
+        return
+
+    database = engine.url.database if engine.dialect.name == 'sqlite' else None
+    if fcntl is None or not database or database == ':memory:':
+        yield
+        return
+    with open(f'{database}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def already_exists(error: DatabaseError) -> bool:
+    """True for errors raised by creating a table, index or column that is already there"""
+    message = str(error.orig).lower()
+    return 'already exists' in message or 'duplicate column' in message
+
+def execute_ddl(conn, statement: str) -> None:
+    """Run one DDL statement, tolerating an object another process created first"""
+    try:
+        # The savepoint keeps the migration's transaction usable on PostgreSQL
+        with conn.begin_nested():
+            conn.exec_driver_sql(statement)
+    except DatabaseError as e:
+        if not already_exists(e):
+            raise
+
+def migration(version: int, description: str):
+    """Register a migration function taking a SQLAlchemy connection"""
+    def register(apply: Callable) -> Callable:
+        MIGRATIONS.append((version, description, apply))
+        return apply
+    return register
+
+@migration(1, 'Composite index for keyset pagination of room messages')
+def add_message_keyset_index(conn):
+    execute_ddl(conn,
+        'CREATE INDEX IF NOT EXISTS ix_messages_room_timestamp_id '
+        'ON messages (room_id, timestamp, id)'
+    )
+
+def load_context(context) -> dict:
+    """JSON columns come back as text from SQLite and already decoded from PostgreSQL"""
+    return json.loads(context) if isinstance(context, str) else context
+
+def max_relevance(context: Optional[dict]) -> Optional[float]:
+    """Highest relevance_score in a message context's metadata, or None without metadata"""
+    if not context or not context.get('metadata'):
+        return None
+    return max(meta.get('relevance_score', 0) for meta in context['metadata'])
+
+@migration(2, 'Denormalized max relevance score on messages')
+def add_message_max_relevance(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('messages')}
+    if 'max_relevance' not in columns:
+        execute_ddl(conn, 'ALTER TABLE messages ADD COLUMN max_relevance FLOAT')
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text('SELECT id, context FROM messages WHERE id > :last_id AND CAST(context AS TEXT) LIKE :pattern '
+                 'ORDER BY id LIMIT 1000'),
+            {'last_id': last_id, 'pattern': '%"metadata"%'}
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [{'score': max_relevance(load_context(context)), 'id': message_id} for message_id, context in rows]
+        conn.execute(text('UPDATE messages SET max_relevance = :score WHERE id = :id'), updates)
+
+    execute_ddl(conn, 'CREATE INDEX IF NOT EXISTS ix_messages_room_relevance ON messages (room_id, max_relevance)')
+
+@migration(3, 'FTS5 full-text index over message content')
+def add_message_fts(conn):
+    # External-content table: the text lives only in `messages`, the index is kept
+    # in sync by triggers. room_id is indexed too so lookups match within one room.
+    if conn.dialect.name != 'sqlite':
+        print('Full-text search uses SQLite FTS5; skipping messages_fts on this database')
+        return
+    try:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            "content, room_id, content='messages', content_rowid='id')"
+        )
+    except OperationalError as e:
+        # SQLite builds without FTS5; relevant context falls back to a Python scan
+        print(f'Full-text search unavailable, skipping messages_fts: {str(e)}')
+        return
+
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts (rowid, content, room_id) VALUES (new.id, new.content, new.room_id); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts (messages_fts, rowid, content, room_id) "
+        "VALUES ('delete', old.id, old.content, old.room_id); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, room_id ON messages BEGIN "
+        "INSERT INTO messages_fts (messages_fts, rowid, content, room_id) "
+        "VALUES ('delete', old.id, old.content, old.room_id); "
+        "INSERT INTO messages_fts (rowid, content, room_id) VALUES (new.id, new.content, new.room_id); END"
+    )
+    # Index the messages written before the table existed
+    conn.exec_driver_sql("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+@migration(4, 'Backfill speech metrics rollups')
+def backfill_speech_rollups(conn):
+    # Recomputed from scratch, so running it twice gives the same totals
+    fields = ('accuracy', 'fluency', 'pronunciation_accuracy', 'speech_quality')
+    totals = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, room_id, timestamp, context FROM messages WHERE id > :last_id "
+                 "AND role = 'user' AND CAST(context AS TEXT) LIKE :pattern ORDER BY id LIMIT 1000"),
+            {'last_id': last_id, 'pattern': '%"speech_metrics"%'}
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for _, room_id, timestamp, context in rows:
+            metrics = load_context(context).get('speech_metrics')
+            if not metrics:
+                continue
+            for period in ('all', str(timestamp)[:10]):
+                sums = totals.setdefault((room_id, period), [0] + [0.0] * len(fields))
+                sums[0] += 1
+                for i, field in enumerate(fields, start=1):
+                    sums[i] += metrics.get(field, 0)
+
+    conn.execute(text('DELETE FROM speech_metrics_rollups'))
+    if totals:
+        conn.execute(
+            text('INSERT INTO speech_metrics_rollups (room_id, period, count, accuracy_sum, fluency_sum, '
+                 'pronunciation_accuracy_sum, speech_quality_sum) '
+                 'VALUES (:room_id, :period, :count, :accuracy, :fluency, :pronunciation, :quality)'),
+            [dict(zip(('count', 'accuracy', 'fluency', 'pronunciation', 'quality'), sums),
+                  room_id=room_id, period=period)
+             for (room_id, period), sums in totals.items()]
+        )
+
+def run_migrations(engine) -> None:
+    """Apply every migration newer than the version recorded in schema_migrations"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description TEXT)'
+        )
+        applied = {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+    for version, description, apply in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            apply(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, description) VALUES (:version, :description) '
+                     'ON CONFLICT (version) DO NOTHING'),
+                {'version': version, 'description': description}
+            )
+        print(f'Applied database migration {version}: {description}')
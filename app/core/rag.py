@@ -1,19 +1,41 @@
 import google.generativeai as genai
 from chromadb import Documents, EmbeddingFunction, Embeddings
 import os
-from typing import List, Dict, Any, Tuple
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Callable, Union
 import chromadb
+import numpy as np
 from datetime import datetime
+from google.api_core import exceptions as google_exceptions
+from config import Config
+from app.core.chroma_pool import get_chroma_pool
+from app.core.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.core.file_extractor import Chunk
+from app.core.lexical_index import BM25IndexBuilder, delete_lexical_index, lexical_index_path, load_lexical_index, tokenize
+from app.core.reranker import RANKING_ONLY_KEYS, chunk_features, metadata_features, rerank, text_overlap
 
 # region : gemini
 import google.generativeai as genai
 
+# Errors worth retrying: rate limits and transient server-side failures
+RETRYABLE_API_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
 class GeminiEmbeddingFunction(EmbeddingFunction):
     """
     Custom embedding function using the Gemini AI API for document retrieval.
 
     This class extends the EmbeddingFunction class and implements the __call__ method
     to generate embeddings for a given set of documents using the Gemini AI API.
+    Embeddings are looked up in the content-addressed embedding cache first, so only
+    texts that have never been embedded with this model/task type hit the network.
 
     Parameters:
     - input (Documents): A collection of documents to be embedded.
@@ -21,16 +43,39 @@ class GeminiEmbeddingFunction(EmbeddingFunction):
     Returns:
     - Embeddings: Embeddings generated for the input documents.
     """
+    def __init__(self, model: str = "models/embedding-001", task_type: str = "retrieval_document"):
+        self.model = model
+        self.task_type = task_type
+
     def __call__(self, input: Documents) -> Embeddings:
+        cache = get_embedding_cache()
+        if cache is None:
+            return self._embed(list(input))
+
+        keys = [EmbeddingCache.make_key(self.model, self.task_type, text) for text in input]
+        cached = cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times in the batch
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            fresh = dict(zip(missing.keys(), self._embed(list(missing.values()))))
+            cache.put_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def _embed(self, texts: List[str]) -> Embeddings:
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         if not gemini_api_key:
             raise ValueError("Gemini API Key not provided. Please provide GEMINI_API_KEY as an environment variable")
         genai.configure(api_key=gemini_api_key)
-        model = "models/embedding-001"
         title = "Custom query"
-        return genai.embed_content(model=model,
-                                   content=input,
-                                   task_type="retrieval_document",
+        return genai.embed_content(model=self.model,
+                                   content=texts,
+                                   task_type=self.task_type,
                                    title=title)["embedding"]
 
 
@@ -60,86 +105,218 @@ def format_chat_history(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     
     return formatted_messages
 
-def create_chroma_db(documents: List[str], path: str, name: str, batch_size: int = 50) -> Tuple[chromadb.Collection, str]:
+def _embed_with_retry(embedding_function: EmbeddingFunction, batch: List[str]) -> Embeddings:
+    """
+    Embeds one batch, backing off exponentially (with jitter) on rate limits
+    and transient API errors.
+    """
+    for attempt in range(Config.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            return embedding_function(batch)
+        except RETRYABLE_API_ERRORS as e:
+            if attempt == Config.EMBEDDING_MAX_RETRIES:
+                raise
+            delay = min(Config.EMBEDDING_RETRY_MAX_DELAY,
+                        Config.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt))
+            delay *= 0.5 + random.random()
+            print(f'Embedding batch failed ({e.__class__.__name__}), retrying in {delay:.1f}s')
+            time.sleep(delay)
+
+
+def _batched(documents: Iterable[Any], batch_size: int) -> Iterator[Tuple[int, List[Any]]]:
+    """Yields (offset, batch) pairs while consuming `documents` lazily."""
+    batch = []
+    offset = 0
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield offset, batch
+            offset += len(batch)
+            batch = []
+    if batch:
+        yield offset, batch
+
+
+def create_chroma_db(documents: Iterable[Union[str, Chunk]], path: str, name: str, batch_size: int = None,
+                     max_workers: int = None,
+                     progress_callback: Callable[[int], None] = None) -> Tuple[chromadb.Collection, str]:
     """
     Creates a Chroma database with proper document handling and metadata.
-    Uses batching for better performance.
+
+    Ingestion is pipelined: `documents` is consumed lazily (so it may be a generator
+    fed by extraction and chunking), batches are embedded concurrently on a bounded
+    worker pool, and finished batches are inserted into Chroma as they complete.
+    The features the reranker needs (word count, position, hashed terms and the
+    source page range) are computed here once and stored as chunk metadata.
     
     Args:
-        documents: List of text chunks to be added
+        documents: Text chunks or Chunk objects to be added (list or iterable)
         path: Path for ChromaDB storage
         name: Collection name
-        batch_size: Number of documents to process in each batch
+        batch_size: Number of documents to embed per API call
+        max_workers: Maximum number of embedding requests in flight
+        progress_callback: Called with the number of chunks stored so far
         
     Returns:
         Tuple of (ChromaDB collection, collection name)
+
+    Raises:
+        Exception: Whatever stopped extraction, embedding or storage, unchanged
     """
+    batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+    max_workers = max_workers or Config.EMBEDDING_CONCURRENCY
     try:
         print(path, name)
-        # Create a clean path without spaces
-        clean_path = str(path).strip()  # Remove any extra spaces
-        chroma_client = chromadb.PersistentClient(path=clean_path)
+        chroma_client = get_chroma_pool().get_client(path)
     
         # Check if collection exists and delete if it does
-        try:
-            chroma_client.delete_collection(name)
-        except:
-            pass
+        delete_chroma_collection(path, name)
+        lexical_builder = BM25IndexBuilder()
+
+        embedding_function = GeminiEmbeddingFunction()
             
         # Create new collection with optimized settings
         db = chroma_client.create_collection(
             name=name.strip(),  # Ensure name has no extra spaces
-            embedding_function=GeminiEmbeddingFunction(),
+            embedding_function=embedding_function,
             metadata={"created_at": datetime.now().isoformat()}
         )
-        print("5")
 
-        # Process documents in batches
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            
-            # Prepare batch metadata
-            metadatas = [{
-                "chunk_id": str(i + j),
-                "chunk_index": i + j,
-                "total_chunks": len(documents),
-                "batch_number": i // batch_size,
-                "timestamp": datetime.now().isoformat()
-            } for j in range(len(batch))]
-            
-            # Add batch to collection
+        # Only known up front when we were handed a list
+        total_chunks = len(documents) if hasattr(documents, '__len__') else None
+        stored = []  # (ids, metadatas) that still need total_chunks filled in
+        stored_count = 0
+
+        def insert(offset: int, batch: List[Union[str, Chunk]], embeddings: Embeddings) -> None:
+            nonlocal stored_count
+            ids = [f"chunk_{str(offset + j)}" for j in range(len(batch))]
+            texts = []
+            metadatas = []
+            for j, item in enumerate(batch):
+                text = item if isinstance(item, str) else item.text
+                tokens = tokenize(text)
+                metadata = {
+                    "chunk_id": str(offset + j),
+                    "chunk_index": offset + j,
+                    "total_chunks": total_chunks or 0,
+                    "position": (offset + j) / total_chunks if total_chunks else 0.0,
+                    "batch_number": offset // batch_size,
+                    **chunk_features(tokens)
+                }
+                if not isinstance(item, str) and item.page_start is not None:
+                    metadata["page_start"] = item.page_start
+                    metadata["page_end"] = item.page_end
+                texts.append(text)
+                metadatas.append(metadata)
+                lexical_builder.add(ids[j], text, tokens=tokens)
+
             db.add(
-                documents=batch,
+                documents=texts,
+                embeddings=embeddings,
                 metadatas=metadatas,
-                ids=[f"chunk_{str(i + j)}" for j in range(len(batch))]
+                ids=ids
             )
+            if total_chunks is None:
+                stored.append((ids, metadatas))
+            stored_count += len(batch)
+            if progress_callback:
+                progress_callback(stored_count)
+
+        def drain(futures: Dict[Future, Tuple[int, List[Union[str, Chunk]]]], return_when: str) -> None:
+            done, _ = wait(futures, return_when=return_when)
+            for future in done:
+                offset, batch = futures.pop(future)
+                insert(offset, batch, future.result())
+
+        in_flight: Dict[Future, Tuple[int, List[Union[str, Chunk]]]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for offset, batch in _batched(documents, batch_size):
+                    # Bound the number of embedded-but-unstored batches held in memory
+                    if len(in_flight) >= max_workers * 2:
+                        drain(in_flight, FIRST_COMPLETED)
+                    texts = [item if isinstance(item, str) else item.text for item in batch]
+                    in_flight[executor.submit(_embed_with_retry, embedding_function, texts)] = (offset, batch)
+                while in_flight:
+                    drain(in_flight, FIRST_COMPLETED)
+            except Exception:
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+        if total_chunks is None:
+            for ids, metadatas in stored:
+                for metadata in metadatas:
+                    metadata["total_chunks"] = stored_count
+                    metadata["position"] = metadata["chunk_index"] / stored_count
+                db.update(ids=ids, metadatas=metadatas)
+
+        # Persist the BM25 index next to the collection for hybrid retrieval
+        lexical_builder.build().save(lexical_index_path(path, name))
 
         return db, name
     except Exception as e:
         print(f'Error creating ChromaDB collection: {str(e)}')
-        return None, None
+        raise
+
+
+def delete_chroma_collection(path: str, name: str) -> None:
+    """
+    Removes a collection's vectors and its BM25 index, if they exist, and drops
+    this process's cached handle.
+    """
+    pool = get_chroma_pool()
+    pool.invalidate(path, name)
+    try:
+        pool.get_client(path).delete_collection(name)
+    except Exception:
+        pass  # Never created, or already deleted
+    delete_lexical_index(path, name)
 
 
 def load_chroma_collection(path: str, name: str) -> chromadb.Collection:
     """
     Loads an existing Chroma collection with the embedding function.
+    Handles are reused from the process-wide pool.
     """
-    chroma_client = chromadb.PersistentClient(path=path)
-    db = chroma_client.get_collection(
-        name=name,
-        embedding_function=GeminiEmbeddingFunction()
-    )
-    return db
+    return get_chroma_pool().get_collection(path, name, GeminiEmbeddingFunction)
+
+
+def warm_up_collections(path: str, names: List[str]) -> None:
+    """
+    Opens the given collections ahead of the first chat so their segments are
+    already loaded when a user asks something.
+    """
+    get_chroma_pool().warm_up(path, names, GeminiEmbeddingFunction)
 
 # region : for the gemini answer
-def get_relevant_passage(query: str, db: chromadb.Collection, n_results: int = 3) -> Tuple[List[str], List[Dict[str, Any]]]:
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Fuses several best-first rankings of ids into one score per id,
+    sum(1 / (k + rank)), which needs no calibration between the rankers.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+def get_relevant_passage(query: str, db: chromadb.Collection, n_results: int = 3,
+                         store_path: str = None) -> Tuple[List[str], List[Dict[str, Any]]]:
     """
     Retrieves relevant passages with improved relevance scoring.
+
+    Candidates come from both the vector index and the collection's BM25 index,
+    fused with reciprocal rank fusion, so exact-term matches (part numbers,
+    acronyms) are found even when they fall outside the vector top-k. The whole
+    candidate pool is then scored in one vectorized reranking pass.
     
     Args:
         query: The search query
         db: ChromaDB collection
         n_results: Number of results to retrieve
+        store_path: Vector store directory `db` was opened from, where its BM25
+            index lives (defaults to Config.VECTOR_STORE_DIR)
         
     Returns:
         Tuple of (passages, metadata)
@@ -147,60 +324,61 @@ def get_relevant_passage(query: str, db: chromadb.Collection, n_results: int = 3
     # Add query preprocessing
     query = query.strip().lower()
     
-    # Get results with more context
+    # Vector candidates
     results = db.query(
         query_texts=[query],
-        n_results=n_results + 2,  # Get extra results for better filtering
-        include=["documents", "metadatas", "distances"]
+        n_results=max(n_results, Config.RETRIEVAL_CANDIDATES),
+        include=["documents", "metadatas"]
     )
-    
-    documents = results['documents'][0]
-    metadatas = results['metadatas'][0]
-    distances = results['distances'][0]
-    
-    # Improved scoring with more sophisticated metrics
-    max_dist = max(distances)
-    min_dist = min(distances)
-    dist_range = max_dist - min_dist
-    
-    scored_results = []
-    for doc, meta, dist in zip(documents, metadatas, distances):
-        # Normalize distance to similarity score
-        norm_dist = (dist - min_dist) / dist_range if dist_range > 0 else 1.0
-        similarity = 1.0 - (norm_dist * 0.7)
-        
-        # Enhanced scoring factors
-        chunk_position = meta.get('chunk_index', 0) / meta.get('total_chunks', 1)
-        recency_score = 0.1  # Base score for all results
-        
-        # Length factor - prefer longer, more complete chunks
-        length_factor = min(1.0, len(doc.split()) / 100)  # Normalize to 0-1
-        
-        # Keyword overlap score
-        query_words = set(query.split())
-        doc_words = set(doc.lower().split())
-        overlap_score = len(query_words & doc_words) / len(query_words) if query_words else 0
-        
-        # Combined score with weighted factors
-        final_score = (
-            similarity * 0.4 +           # Similarity is important but not everything
-            (1 - chunk_position) * 0.2 +  # Earlier chunks slightly preferred
-            recency_score * 0.1 +         # Small boost for recency
-            length_factor * 0.15 +        # Preference for complete chunks
-            overlap_score * 0.15          # Direct keyword matching
-        )
-        
-        meta['relevance_score'] = final_score
-        scored_results.append((final_score, doc, meta))
-    
-    # Sort by score and take top n_results
-    scored_results.sort(reverse=True)
-    top_results = scored_results[:n_results]
+    ids = list(results['ids'][0])
+    documents = list(results['documents'][0])
+    metadatas = list(results['metadatas'][0])
+    rankings = [ids[:]]
+    lexical_hits = {}
+
+    # Lexical candidates (collections built before BM25 indexing only have vectors)
+    lexical_index = load_lexical_index(store_path or Config.VECTOR_STORE_DIR, db.name)
+    if lexical_index is not None:
+        lexical_hits = dict(lexical_index.search(query, Config.RETRIEVAL_CANDIDATES))
+        lexical_ids = list(lexical_hits)
+        rankings.append(lexical_ids)
+        seen = set(ids)
+        missing = [doc_id for doc_id in lexical_ids if doc_id not in seen]
+        if missing:
+            fetched = db.get(ids=missing, include=["documents", "metadatas"])
+            ids.extend(fetched['ids'])
+            documents.extend(fetched['documents'])
+            metadatas.extend(fetched['metadatas'])
+
+    if not ids:
+        return [], []
+
+    fused = reciprocal_rank_fusion(rankings)
+    fused_scores = np.fromiter((fused[doc_id] for doc_id in ids), dtype=np.float32, count=len(ids))
+
+    # Ranking features were computed at ingest; only legacy chunks need their text reprocessed
+    positions, word_counts, overlap = metadata_features(query, metadatas)
+    legacy = np.flatnonzero(np.isnan(word_counts))
+    if legacy.size:
+        word_counts[legacy], overlap[legacy] = text_overlap(query, [documents[i] for i in legacy])
+
+    # Candidates outside the BM25 top-k count as no lexical match
+    lexical_scores = np.fromiter((lexical_hits.get(doc_id, 0.0) for doc_id in ids), dtype=np.float32, count=len(ids)) \
+        if lexical_index is not None else None
+
+    top, scores = rerank(fused_scores, positions, word_counts, overlap, n_results, lexical_scores=lexical_scores)
+
+    top_results = []
+    for i in top:
+        # Callers store this metadata with every reply, so drop the ranking internals
+        meta = {key: value for key, value in metadatas[i].items() if key not in RANKING_ONLY_KEYS}
+        meta['relevance_score'] = float(scores[i])
+        top_results.append((documents[i], meta))
     
     # Return in original format
     return (
-        [doc for _, doc, _ in top_results],
-        [meta for _, _, meta in top_results]
+        [doc for doc, _ in top_results],
+        [meta for _, meta in top_results]
     )
 
 def make_rag_prompt(query: str, relevant_passages: List[str], metadata: List[Dict[str, Any]], chat_history: List[Dict[str, Any]] = None) -> str:
@@ -246,60 +424,152 @@ Answer:"""
     
     return prompt
 
+SYSTEM_INSTRUCTION = """You are an expert AI assistant with deep knowledge and analytical capabilities.
+Your responses should be:
+1. Clear and concise - Get straight to the point
+2. Well-structured - Use bullet points or numbered lists when appropriate
+3. Evidence-based - Support your answers with specific details
+4. Professional yet friendly - Maintain a helpful tone
+5. Actionable - Provide practical next steps when relevant
+
+When answering questions:
+- Break down complex topics into digestible parts
+- Use examples to illustrate points
+- Acknowledge limitations or uncertainties
+- Ask clarifying questions if needed
+- Provide context for your answers
+
+If you're not sure about something, say so rather than making assumptions."""
+
+TUTOR_SYSTEM_INSTRUCTION = """You are a friendly and engaging English language tutor. 
+Your responses should be:
+1. Natural and conversational - like talking to a friend
+2. Warm and encouraging - always find something positive to say
+3. Specific and actionable - give clear, practical advice
+4. Brief but meaningful - keep responses concise but helpful
+5. Personal - use "you" and "your" to make it more engaging
+
+Remember to:
+- Start with a friendly greeting or acknowledgment
+- Use contractions (e.g., "you're" instead of "you are")
+- Keep the tone light and supportive"""
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for history budgeting."""
+    return len(text) // 4 + 1
+
+
+def build_history_contents(chat_history: List[Dict[str, Any]], token_budget: int = None) -> List[Dict[str, Any]]:
+    """
+    Converts stored chat history into Gemini `contents`, keeping only the most
+    recent turns that fit in `token_budget`.
+
+    Accepts messages shaped either as {'role', 'content'} or {'role', 'parts'}.
+    System messages are dropped (they are UI notices, not conversation), assistant
+    turns are mapped to the 'model' role, and consecutive turns from the same
+    speaker are merged.
+    """
+    token_budget = token_budget or Config.HISTORY_TOKEN_BUDGET
+    window = []
+    used = 0
+    for msg in reversed(chat_history or []):
+        if msg['role'] == 'system':
+            continue
+        if 'content' in msg:
+            text = msg['content']
+        else:
+            text = "".join(part.get('text', '') for part in msg.get('parts', []))
+        if not text:
+            continue
+        tokens = _estimate_tokens(text)
+        if used + tokens > token_budget:
+            break
+        used += tokens
+        window.append(('model' if msg['role'] in ('assistant', 'model') else 'user', text))
+    window.reverse()
+
+    contents = []
+    for role, text in window:
+        if contents and contents[-1]['role'] == role:
+            contents[-1]['parts'].append({'text': text})
+        else:
+            contents.append({'role': role, 'parts': [{'text': text}]})
+
+    # A conversation has to open with a user turn
+    while contents and contents[0]['role'] != 'user':
+        contents.pop(0)
+    return contents
+
+
+_models: Dict[str, genai.GenerativeModel] = {}
+
+
+def _get_model(system_instruction: str) -> genai.GenerativeModel:
+    """Returns a cached GenerativeModel for the given system instruction."""
+    model = _models.get(system_instruction)
+    if model is None:
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if gemini_api_key:
+            genai.configure(api_key=gemini_api_key)
+        model = genai.GenerativeModel(Config.GEMINI_MODEL, system_instruction=system_instruction)
+        _models[system_instruction] = model
+    return model
+
+
+def generate_chat_reply(message: str, chat_history: List[Dict[str, Any]] = None,
+                        system_instruction: str = TUTOR_SYSTEM_INSTRUCTION) -> str:
+    """
+    Answers `message` in a single generation call, with the system instruction
+    and a token-budgeted history window passed alongside it. Errors propagate.
+    """
+    contents = build_history_contents(chat_history)
+    contents.append({'role': 'user', 'parts': [{'text': message}]})
+    response = _get_model(system_instruction).generate_content(contents)
+    return response.text
+
+
+def stream_chat_reply(message: str, chat_history: List[Dict[str, Any]] = None,
+                      system_instruction: str = TUTOR_SYSTEM_INSTRUCTION) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_chat_reply: yields text fragments as the
+    model produces them. Nothing is sent until the generator is first iterated.
+    """
+    contents = build_history_contents(chat_history)
+    contents.append({'role': 'user', 'parts': [{'text': message}]})
+    for chunk in _get_model(system_instruction).generate_content(contents, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. the final finish-reason chunk)
+            continue
+        if text:
+            yield text
+
+
 def generate_gemini_answer(prompt: str, chat_history: List[Dict[str, Any]] = None) -> str:
     """
     Generates an answer using Gemini model with chat history context.
+    The whole conversation goes out as one request.
     """
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
+    if not os.getenv("GEMINI_API_KEY"):
         raise ValueError("Gemini API Key not provided")
     
-    genai.configure(api_key=gemini_api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    
     try:
-        # Start a new chat
-        chat = model.start_chat()
-        
-        # Enhanced system message with better structure and guidelines
-        chat.send_message("""You are an expert AI assistant with deep knowledge and analytical capabilities.
-        Your responses should be:
-        1. Clear and concise - Get straight to the point
-        2. Well-structured - Use bullet points or numbered lists when appropriate
-        3. Evidence-based - Support your answers with specific details
-        4. Professional yet friendly - Maintain a helpful tone
-        5. Actionable - Provide practical next steps when relevant
-        
-        When answering questions:
-        - Break down complex topics into digestible parts
-        - Use examples to illustrate points
-        - Acknowledge limitations or uncertainties
-        - Ask clarifying questions if needed
-        - Provide context for your answers
-        
-        If you're not sure about something, say so rather than making assumptions.""")
-        
-        # Add chat history if provided
-        if chat_history:
-            for msg in chat_history:
-                chat.send_message(msg['content'])
-        
-        # Send the prompt and get response
-        response = chat.send_message(prompt)
-        return response.text
-        
+        return generate_chat_reply(prompt, chat_history, system_instruction=SYSTEM_INSTRUCTION)
     except Exception as e:
         return f"Error generating response: {str(e)}"
 
-def generate_answer(db: chromadb.Collection, query: str, chat_history: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+def prepare_answer(db: chromadb.Collection, query: str, store_path: str = None) -> Tuple[str, Dict[str, Any]]:
     """
-    Generates an answer with supporting information and chat context.
-    
+    Retrieves supporting passages for `query` and builds the answer prompt.
+    `store_path` is the vector store directory `db` was opened from.
+
     Returns:
-    - Dictionary containing answer and supporting information
+    - Tuple of (prompt, supporting information)
     """
     # Get relevant passages and metadata
-    relevant_passages, metadata = get_relevant_passage(query, db, n_results=3)
+    relevant_passages, metadata = get_relevant_passage(query, db, n_results=3, store_path=store_path)
     
     # Create prompt with chat history and better structure
     prompt = f"""Based on the following context and question, provide a comprehensive answer:
@@ -316,6 +586,23 @@ Please structure your response as follows:
 4. Next Steps: Suggest any follow-up actions or questions if applicable
 
 If the context doesn't fully answer the question, please acknowledge this and suggest what additional information might be needed."""
+
+    supporting_info = {
+        "passages": relevant_passages,
+        "metadata": metadata,
+        "confidence_scores": [meta.get('relevance_score', 0) for meta in metadata]
+    }
+    return prompt, supporting_info
+
+def generate_answer(db: chromadb.Collection, query: str, chat_history: List[Dict[str, Any]] = None,
+                    store_path: str = None) -> Dict[str, Any]:
+    """
+    Generates an answer with supporting information and chat context.
+    
+    Returns:
+    - Dictionary containing answer and supporting information
+    """
+    prompt, supporting_info = prepare_answer(db, query, store_path=store_path)
     
     # Generate answer
     answer = generate_gemini_answer(prompt, chat_history)
@@ -323,9 +610,5 @@ If the context doesn't fully answer the question, please acknowledge this and su
     # Return comprehensive response with confidence scores
     return {
         "answer": answer,
-        "supporting_info": {
-            "passages": relevant_passages,
-            "metadata": metadata,
-            "confidence_scores": [meta.get('relevance_score', 0) for meta in metadata]
-        }
+        "supporting_info": supporting_info
     }
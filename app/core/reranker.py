@@ -0,0 +1,139 @@
+import zlib
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from .lexical_index import tokenize
+
+# Weights of the relevance factors; they sum to 1 with the constant recency boost.
+# The retrieval signals carry 0.8, so the position and length priors only break ties.
+SIMILARITY_WEIGHT = 0.3   # Fused vector + lexical rank
+LEXICAL_WEIGHT = 0.3      # BM25 score, which weights rare terms (part numbers) over common ones
+OVERLAP_WEIGHT = 0.2      # Direct keyword matching
+POSITION_WEIGHT = 0.05    # Earlier chunks slightly preferred
+LENGTH_WEIGHT = 0.05      # Preference for complete chunks
+RECENCY_WEIGHT = 0.1      # Small boost for recency
+RECENCY_SCORE = 0.1       # Base recency score for all results
+
+
+def hash_terms(terms: Iterable[str]) -> np.ndarray:
+    """Sorted, de-duplicated 32-bit hashes of normalized terms."""
+    return np.unique(np.fromiter(
+        (zlib.crc32(term.encode('utf-8')) for term in terms),
+        dtype=np.uint32
+    ))
+
+
+# Chunk metadata only the reranker reads; stripped before passages are returned
+RANKING_ONLY_KEYS = ('term_hashes', 'word_count', 'position')
+
+
+def chunk_features(tokens: Sequence[str]) -> Dict[str, object]:
+    """
+    Ranking features computed once per chunk at ingest time and stored as
+    Chroma metadata (which only holds scalars, so the hashed term list is
+    packed into a hex string).
+    """
+    return {
+        "word_count": len(tokens),
+        "term_hashes": hash_terms(set(tokens)).astype('>u4').tobytes().hex()
+    }
+
+
+def metadata_features(query: str, metadatas: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Positions, word counts and query-term overlap for a candidate batch, read
+    from precomputed chunk metadata. Overlap is a single np.isin over the
+    concatenated term hashes of every candidate.
+
+    Returns:
+    - Tuple of (positions, word_counts, overlap); word_counts and overlap are NaN
+      for chunks ingested before features were stored.
+    """
+    n = len(metadatas)
+    positions = np.fromiter(
+        (meta['position'] if 'position' in meta
+         else meta.get('chunk_index', 0) / (meta.get('total_chunks') or 1)
+         for meta in metadatas),
+        dtype=np.float32,
+        count=n
+    )
+    word_counts = np.fromiter(
+        (meta.get('word_count', np.nan) for meta in metadatas),
+        dtype=np.float32,
+        count=n
+    )
+
+    blobs = [bytes.fromhex(meta.get('term_hashes', '')) for meta in metadatas]
+    hashes = np.frombuffer(b''.join(blobs), dtype='>u4')
+    owners = np.repeat(np.arange(n), [len(blob) // 4 for blob in blobs])
+    query_terms = set(tokenize(query))
+    if query_terms:
+        matches = np.isin(hashes, hash_terms(query_terms))
+        overlap = np.bincount(owners[matches], minlength=n).astype(np.float32) / len(query_terms)
+    else:
+        overlap = np.zeros(n, dtype=np.float32)
+    overlap[np.isnan(word_counts)] = np.nan
+    return positions, word_counts, overlap
+
+
+def text_overlap(query: str, documents: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Fallback word counts and overlap computed from the passage text."""
+    query_terms = set(tokenize(query))
+    word_counts = np.empty(len(documents), dtype=np.float32)
+    overlap = np.zeros(len(documents), dtype=np.float32)
+    for i, doc in enumerate(documents):
+        doc_terms = tokenize(doc)
+        word_counts[i] = len(doc_terms)
+        if query_terms:
+            overlap[i] = len(query_terms.intersection(doc_terms)) / len(query_terms)
+    return word_counts, overlap
+
+
+def rerank(fused_scores: np.ndarray, positions: np.ndarray, word_counts: np.ndarray,
+           overlap: np.ndarray, n_results: int, lexical_scores: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scores a whole candidate batch at once and returns the best `n_results`.
+
+    Args:
+        fused_scores: Retrieval score per candidate (higher is better)
+        positions: Normalized chunk position per candidate
+        word_counts: Token count per candidate
+        overlap: Fraction of query terms present in each candidate
+        n_results: Number of candidates to keep
+        lexical_scores: BM25 score per candidate, 0 where unknown; omitted for
+            collections without a lexical index
+
+    Returns:
+        Tuple of (indices of the top candidates best first, relevance score of every candidate)
+    """
+    # Normalize the retrieval score to a similarity in [0.3, 1]
+    best, worst = fused_scores.max(), fused_scores.min()
+    spread = best - worst
+    if spread > 0:
+        similarity = 1.0 - ((best - fused_scores) / spread) * 0.7
+    else:
+        similarity = np.full_like(fused_scores, 0.3)
+
+    length_factor = np.minimum(1.0, word_counts / 100)  # Normalize to 0-1
+
+    # BM25 relative to the best candidate, so it lands in [0, 1] like the other factors
+    lexical = np.zeros_like(similarity)
+    if lexical_scores is not None and lexical_scores.max() > 0:
+        lexical = lexical_scores / lexical_scores.max()
+
+    scores = (
+        similarity * SIMILARITY_WEIGHT +
+        lexical * LEXICAL_WEIGHT +
+        (1 - positions) * POSITION_WEIGHT +
+        RECENCY_SCORE * RECENCY_WEIGHT +
+        length_factor * LENGTH_WEIGHT +
+        overlap * OVERLAP_WEIGHT
+    )
+
+    if len(scores) > n_results:
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top, scores
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    """The process-wide pool stages run on, created on first use (after gunicorn forks)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.VOICE_STAGE_WORKERS,
+                                               thread_name_prefix='voice-stage')
+    return _executor
+
+
+class StageTimeout(Exception):
+    """Raised by StageRunner.result when a stage misses its deadline"""
+
+
+class StageMetrics:
+    """Per-stage run counts and latencies of this process, for /stats/voice"""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(lambda: {'runs': 0, 'errors': 0, 'timeouts': 0})
+
+    def record(self, stage: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self._recent[stage].append(seconds)
+            self._counts[stage]['runs'] += 1
+            if not ok:
+                self._counts[stage]['errors'] += 1
+
+    def record_timeout(self, stage: str) -> None:
+        with self._lock:
+            self._counts[stage]['timeouts'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            snapshot = {stage: (sorted(self._recent[stage]), dict(counts)) for stage, counts in self._counts.items()}
+
+        result = {}
+        for stage, (recent, counts) in snapshot.items():
+            def percentile(q: float) -> Optional[float]:
+                return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 1) if recent else None
+            result[stage] = {
+                **counts,
+                'p50_ms': percentile(0.5),
+                'p95_ms': percentile(0.95),
+                'max_ms': round(recent[-1] * 1000, 1) if recent else None
+            }
+        return result
+
+stage_metrics = StageMetrics()
+
+
+class StageRunner:
+    """
+    Schedules the stages of one request. `submit` starts a stage on the shared
+    pool so independent stages overlap, `result` waits for it until its
+    deadline (counted from submission) and `run` times a stage on the calling
+    thread, e.g. one that needs the request's database session.
+
+    Every stage's wall time lands in `timings`. A stage that misses its
+    deadline keeps running in the background, but the request stops waiting
+    for it.
+    """
+    def __init__(self, timeouts: Dict[str, float] = None, executor: ThreadPoolExecutor = None):
+        self.timeouts = Config.VOICE_STAGE_TIMEOUTS if timeouts is None else timeouts
+        self._executor = executor
+        self._futures: Dict[str, Future] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._timings: Dict[str, float] = {}
+        self.timed_out: List[str] = []
+        self._started = time.perf_counter()
+
+    def _timed(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        ok = False
+        try:
+            value = fn(*args, **kwargs)
+            ok = True
+            return value
+        finally:
+            elapsed = time.perf_counter() - start
+            stage_metrics.record(name, elapsed, ok)
+            with self._lock:
+                self._timings[name] = round(elapsed * 1000, 1)
+
+    def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run a stage on the calling thread and record its time"""
+        return self._timed(name, fn, *args, **kwargs)
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs) -> None:
+        """Start a stage on the pool; collect it with result(name)"""
+        executor = self._executor or get_stage_executor()
+        timeout = self.timeouts.get(name)
+        self._deadlines[name] = time.perf_counter() + timeout if timeout else None
+        self._futures[name] = executor.submit(self._timed, name, fn, *args, **kwargs)
+
+    def result(self, name: str) -> Any:
+        """
+        The submitted stage's return value. Re-raises the stage's exception,
+        or raises StageTimeout once its deadline has passed.
+        """
+        future = self._futures[name]
+        deadline = self._deadlines[name]
+        try:
+            return future.result(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        except FutureTimeout:
+            future.cancel()  # Only helps if it never started
+            stage_metrics.record_timeout(name)
+            self.timed_out.append(name)
+            raise StageTimeout(f"Stage '{name}' did not finish within {self.timeouts[name]}s")
+
+    def timings(self) -> Dict:
+        """Milliseconds per finished stage, plus the total since the runner was created"""
+        with self._lock:
+            timings = dict(self._timings)
+        timings['total'] = round((time.perf_counter() - self._started) * 1000, 1)
+        return timings
@@ -0,0 +1,116 @@
+import atexit
+import threading
+from collections import deque
+from typing import Callable, Dict, List
+
+from .database import Session
+
+
+class MessageWriteBehind:
+    """
+    Buffers message inserts and writes them in grouped transactions.
+
+    A background thread flushes the buffer every `flush_interval` seconds, or
+    sooner once `max_batch` rows are waiting. Readers call flush() first, so a
+    process always reads its own writes. Other processes see a message at most
+    one interval late, and rows still buffered when the process is killed are
+    lost. Flushes are serialized, so rows are committed in the order they were
+    added.
+
+    A batch that fails is put back and retried by the next `max_retries`
+    flushes. After that it is written row by row, and rows that still fail are
+    moved to `dead_letters` rather than blocking every later flush.
+    """
+    def __init__(self, write_batch: Callable[[List[Dict]], None], flush_interval: float, max_batch: int,
+                 max_retries: int = 3, max_dead_letters: int = 1000):
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self._pending: List[Dict] = []
+        self._retries = 0  # Consecutive failed flushes of the rows at the front of _pending
+        self.dead_letters = deque(maxlen=max_dead_letters)
+        self._lock = threading.Lock()  # Guards _pending and the counters
+        self._flush_lock = threading.Lock()  # One flush at a time
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.messages_flushed = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+        atexit.register(self.flush)
+
+    def add(self, row: Dict) -> None:
+        """Queue one message row (a dict of Message column values)"""
+        with self._lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.max_batch
+            if self._thread is None:
+                # Started lazily so it runs in the worker process, after gunicorn forks
+                self._thread = threading.Thread(target=self._run, name='message-write-behind', daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write everything queued so far in the calling thread; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._write_batch(batch)
+                written = len(batch)
+            except Exception:
+                if self._retries < self.max_retries:
+                    self._retries += 1
+                    with self._lock:
+                        # Put the rows back in front so a later flush retries them in order
+                        self._pending[:0] = batch
+                    raise
+                written = self._write_rows(batch)
+            self._retries = 0
+            with self._lock:
+                self.flushes += 1
+                self.messages_flushed += written
+            return written
+
+    def _write_rows(self, batch: List[Dict]) -> int:
+        """Write a batch that keeps failing one row at a time, dead-lettering the rows that fail"""
+        written = 0
+        for row in batch:
+            try:
+                self._write_batch([row])
+                written += 1
+            except Exception as e:
+                with self._lock:
+                    self.dead_letters.append((row, str(e)))
+                    self.dead_lettered += 1
+                print(f"Write-behind dropped a message for room {row.get('room_id')}: {str(e)}")
+        return written
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                with self._lock:
+                    self.failed_batches += 1
+                print(f"Write-behind flush failed: {str(e)}")
+            finally:
+                Session.remove()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'flushes': self.flushes,
+                'messages_flushed': self.messages_flushed,
+                'avg_batch_size': round(self.messages_flushed / self.flushes, 2) if self.flushes else None,
+                'failed_batches': self.failed_batches,
+                'dead_lettered': self.dead_lettered,
+                'flush_interval_seconds': self.flush_interval
+            }
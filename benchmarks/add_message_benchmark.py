@@ -0,0 +1,92 @@
+"""
+Measure concurrent ChatManager.add_message throughput.
+
+Usage:
+    python benchmarks/add_message_benchmark.py [--processes 3] [--threads 4] [--messages 200] [--write-behind]
+
+Runs against a throwaway SQLite database (CHAT_DB_PATH is pointed at a temp file),
+with several processes, like gunicorn workers, each writing from several threads.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(db_path, room_id, threads, messages, write_behind, results):
+    os.environ['CHAT_DB_PATH'] = db_path
+    sys.path.insert(0, ROOT)
+    from app.core.chat_room import ChatManager
+    from app.core.database import Session, commit_metrics
+
+    manager = ChatManager(ROOT, write_behind=write_behind)
+    errors = []
+
+    def write():
+        try:
+            for i in range(messages):
+                manager.add_message(room_id, f"benchmark message {i}", 'user', context={'i': i})
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            Session.remove()
+
+    pool = [threading.Thread(target=write) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    manager.flush()
+    results.put((errors, commit_metrics.stats()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=200, help='messages per thread')
+    parser.add_argument('--write-behind', action='store_true', help='batch inserts into grouped transactions')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_chat.db')
+    os.environ['CHAT_DB_PATH'] = db_path
+    sys.path.insert(0, ROOT)
+    from app.core.chat_room import ChatManager
+    from app.core.database import Session, init_db
+    init_db()
+    room_id = ChatManager(ROOT).create_room('benchmark').id
+    Session.remove()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(db_path, room_id, args.threads, args.messages, args.write_behind, results))
+        for _ in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    errors = [error for worker_errors, _ in outcomes for error in worker_errors]
+    commits = sum(stats['commits'] for _, stats in outcomes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    total = args.processes * args.threads * args.messages
+    print(f"{total} messages from {args.processes} processes x {args.threads} threads in {elapsed:.2f}s")
+    print(f"mode: {'write-behind' if args.write_behind else 'direct'}")
+    print(f"throughput: {total / elapsed:.0f} messages/s, failed writers: {len(errors)}")
+    print(f"commits: {commits} ({total / max(commits, 1):.1f} messages per commit)")
+    for _, stats in outcomes:
+        print(f"  worker commit latency avg {stats['avg_commit_ms']} ms, p95 {stats['p95_commit_ms']} ms")
+    for error in errors[:5]:
+        print(f"  {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare the native single-pass chunker with LangChain's RecursiveCharacterTextSplitter.
+
+Usage:
+    python benchmarks/chunker_benchmark.py [path/to/document.pdf] [--pages N]
+
+Without a PDF, a synthetic document of N pages (default 2000) is used.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.file_extractor import iter_chunks, iter_pdf_pages
+from config import Config
+
+
+def synthetic_pages(count: int):
+    random.seed(0)
+    vocabulary = ["pump", "valve", "XJ-900", "pressure", "the", "a", "of", "system.",
+                  "maintenance", "check", "torque", "bolt", "seal,", "flow", "rate"]
+    return [(i + 1, " ".join(random.choices(vocabulary, k=400))) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('pdf', nargs='?')
+    parser.add_argument('--pages', type=int, default=2000)
+    args = parser.parse_args()
+
+    pages = list(iter_pdf_pages(args.pdf)) if args.pdf else synthetic_pages(args.pages)
+    text = " ".join(page_text for _, page_text in pages if page_text)
+    print(f"Document: {len(pages)} pages, {len(text):,} characters")
+    print(f"Chunk size {Config.CHUNK_SIZE}, overlap {Config.CHUNK_OVERLAP}")
+
+    start = time.perf_counter()
+    native = list(iter_chunks(pages))
+    print(f"native chunker:      {len(native):6d} chunks in {time.perf_counter() - start:.3f}s")
+
+    try:
+        start = time.perf_counter()
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=Config.CHUNK_SIZE,
+            chunk_overlap=Config.CHUNK_OVERLAP,
+            length_function=len,
+            separators=["\n\n", "\n", ". ", " ", ""],
+            is_separator_regex=False
+        )
+        chunks = splitter.split_text(text)
+        print(f"langchain splitter:  {len(chunks):6d} chunks in {time.perf_counter() - start:.3f}s (incl. import)")
+    except ImportError:
+        print("langchain is not installed; skipping the comparison")
+
+
+if __name__ == '__main__':
+    main()
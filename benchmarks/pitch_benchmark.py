@@ -0,0 +1,90 @@
+"""
+Time intonation.pitch on long synthetic recordings, split into Praat pitch tracking and per-word statistics.
+
+Usage:
+    python benchmarks/pitch_benchmark.py [--minutes 1 5 10] [--word-seconds 0.35]
+
+The clip is a harmonic tone whose F0 glides between 90 and 220 Hz, with a short
+pause every few words, and word offsets laid out back to back. The per-word
+step is also compared with a naive loop that masks the whole frame array once
+per word.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parselmouth
+
+from app.core.audio import AudioBuffer
+from app.core.intonation import pitch, word_pitch_stats
+from config import Config
+
+
+class Word(NamedTuple):
+    word: str
+    start: float
+    end: float
+    confidence: float = 1.0
+
+
+def synthetic_clip(seconds: float, sample_rate: int, word_seconds: float):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 155 + 65 * np.sin(2 * np.pi * t / 3.0)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    samples = sum(np.sin(k * phase) / k for k in range(1, 6)) * 0.2
+    # Silence between groups of words, so some frames are unvoiced
+    samples[(t % (word_seconds * 6)) > word_seconds * 5] = 0
+    words = [Word(f'w{i}', start, start + word_seconds)
+             for i, start in enumerate(np.arange(0, seconds - word_seconds, word_seconds))]
+    return AudioBuffer(samples, sample_rate), words
+
+
+def naive_word_means(times: np.ndarray, frequencies: np.ndarray, words) -> list:
+    means = []
+    for word in words:
+        span = frequencies[(times >= word.start) & (times <= word.end) & (frequencies > 0)]
+        means.append(span.mean() if span.size else None)
+    return means
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--word-seconds', type=float, default=0.35)
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        audio, words = synthetic_clip(minutes * 60, Config.SAMPLE_RATE, args.word_seconds)
+
+        start = time.perf_counter()
+        pitch_obj = parselmouth.Sound(audio.samples.astype(np.float64), sampling_frequency=audio.sample_rate).to_pitch()
+        tracking = time.perf_counter() - start
+        times, frequencies = pitch_obj.xs(), pitch_obj.selected_array['frequency']
+
+        start = time.perf_counter()
+        word_pitch_stats(times, frequencies, words)
+        aligned = time.perf_counter() - start
+
+        start = time.perf_counter()
+        naive_word_means(times, frequencies, words)
+        naive = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pitch(words, audio)
+        total = time.perf_counter() - start
+
+        print(f"{minutes:5.1f} min, {len(words):5d} words, {len(times):6d} frames:"
+              f"  praat {tracking * 1000:8.1f} ms"
+              f"  word stats {aligned * 1000:7.1f} ms"
+              f"  naive masks {naive * 1000:8.1f} ms"
+              f"  pitch() {total * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare FTS5 lookups with the Python word-overlap scan in ChatManager.get_relevant_context.
+
+Usage:
+    python benchmarks/relevant_context_benchmark.py [--sizes 10000 100000] [--queries 20]
+
+Each size gets its own room in a throwaway SQLite database (CHAT_DB_PATH).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('CHAT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench_chat.db'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from app.core import database
+from app.core.chat_room import ChatManager
+from app.core.database import Message, Session, init_db
+
+# Zipf-like word frequencies over a synthetic vocabulary, roughly like chat text
+random.seed(0)
+VOCABULARY = ["".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(2, 9))) for _ in range(5000)]
+WEIGHTS = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+
+
+def fill_room(manager: ChatManager, size: int) -> int:
+    room_id = manager.create_room(f'benchmark {size}').id
+    random.seed(size)
+    for start in range(0, size, 5000):
+        rows = [{
+            'room_id': room_id,
+            'content': " ".join(random.choices(VOCABULARY, WEIGHTS, k=random.randint(5, 40))),
+            'role': random.choice(['user', 'assistant'])
+        } for _ in range(start, min(start + 5000, size))]
+        Session().execute(insert(Message), rows)
+        Session().commit()
+    return room_id
+
+
+def time_queries(manager: ChatManager, room_id: int, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        manager.get_relevant_context(room_id, query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    init_db()
+    manager = ChatManager('.')
+    queries = [" ".join(random.choices(VOCABULARY, WEIGHTS, k=4)) for _ in range(args.queries)]
+    fts_enabled = database.FTS_ENABLED
+    for size in args.sizes:
+        room_id = fill_room(manager, size)
+        line = f"{size:7d} messages:"
+        if fts_enabled:
+            line += f"  fts5 {time_queries(manager, room_id, queries):8.2f} ms/query"
+        database.FTS_ENABLED = False
+        line += f"  python scan {time_queries(manager, room_id, queries[:3]):8.2f} ms/query"
+        database.FTS_ENABLED = fts_enabled
+        print(line)
+        Session.remove()
+
+
+if __name__ == '__main__':
+    main()
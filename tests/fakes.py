@@ -0,0 +1,29 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+
+class FakeSpeechClient:
+    """
+    Offline stand-in for speech.SpeechClient. Every recognize call answers with
+    `transcript`, one word per whitespace-separated token spaced `word_duration`
+    seconds apart, and is recorded in `calls` so tests can count requests.
+    """
+    def __init__(self, transcript: str = '', confidence: float = 0.95, word_duration: float = 0.4):
+        self.transcript = transcript
+        self.confidence = confidence
+        self.word_duration = word_duration
+        self.calls = []
+
+    def recognize(self, config, audio):
+        self.calls.append((config, audio))
+        tokens = self.transcript.split()
+        if not tokens:
+            return SimpleNamespace(results=[])
+        words = [SimpleNamespace(
+            word=token,
+            start_time=timedelta(seconds=i * self.word_duration),
+            end_time=timedelta(seconds=(i + 1) * self.word_duration),
+            confidence=self.confidence
+        ) for i, token in enumerate(tokens)]
+        alternative = SimpleNamespace(transcript=self.transcript, confidence=self.confidence, words=words)
+        return SimpleNamespace(results=[SimpleNamespace(alternatives=[alternative])])
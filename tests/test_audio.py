@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.core import audio
+from app.core.audio import AudioDecodeError, decode_audio
+
+
+def tone(seconds: float, sample_rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 220 * t) * 0.5).astype(np.float32)
+
+
+def webm_opus(samples: np.ndarray, sample_rate: int = 48000) -> bytes:
+    """What a browser's MediaRecorder uploads"""
+    av = pytest.importorskip('av')
+    buffer = io.BytesIO()
+    with av.open(buffer, mode='w', format='webm') as container:
+        stream = container.add_stream('libopus', rate=sample_rate)
+        stream.layout = 'mono'
+        for start in range(0, len(samples), 960):
+            frame = av.AudioFrame.from_ndarray(samples[start:start + 960].reshape(1, -1), format='flt', layout='mono')
+            frame.sample_rate = sample_rate
+            frame.pts = start
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def no_ffmpeg(data, sample_rate):
+    raise AssertionError('ffmpeg should not be spawned')
+
+
+def test_wav_is_decoded_and_resampled():
+    buffer = io.BytesIO()
+    sf.write(buffer, tone(1.0, 44100), 44100, format='WAV')
+
+    clip = decode_audio(buffer.getvalue(), sample_rate=16000)
+    assert clip.sample_rate == 16000
+    assert clip.duration == pytest.approx(1.0, abs=0.01)
+    assert not clip.samples.flags.writeable
+
+
+def test_webm_opus_is_decoded_in_process(monkeypatch):
+    data = webm_opus(tone(1.0, 48000))
+    monkeypatch.setattr(audio, '_decode_with_ffmpeg', no_ffmpeg)
+
+    clip = decode_audio(data, sample_rate=16000)
+    assert clip.duration == pytest.approx(1.0, abs=0.05)
+    assert np.abs(clip.samples).max() == pytest.approx(0.5, abs=0.1)
+
+
+def test_undecodable_upload(monkeypatch):
+    pytest.importorskip('av')
+    monkeypatch.setattr(audio, '_decode_with_ffmpeg', no_ffmpeg)
+    with pytest.raises(AudioDecodeError):
+        decode_audio(b'not audio at all' * 10)
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.core import database
+from app.core.chat_room import decode_cursor
+
+
+def metrics(accuracy, fluency=50.0, pronunciation_accuracy=80.0, speech_quality=60.0):
+    return {'speech_metrics': {
+        'accuracy': accuracy,
+        'fluency': fluency,
+        'pronunciation_accuracy': pronunciation_accuracy,
+        'speech_quality': speech_quality
+    }}
+
+
+def fill(chat_manager, room_id, count, prefix='message'):
+    return [chat_manager.add_message(room_id, f'{prefix} {i}', 'user' if i % 2 == 0 else 'assistant').id
+            for i in range(count)]
+
+
+def test_add_message_and_history_order(chat_manager):
+    room = chat_manager.create_room('history')
+    other = chat_manager.create_room('other')
+    ids = fill(chat_manager, room.id, 5)
+    fill(chat_manager, other.id, 3)
+
+    history = chat_manager.get_room_history(room.id)
+    assert [msg.id for msg in history] == ids
+    assert all(isinstance(message_id, int) for message_id in ids)
+    assert [msg.content for msg in history] == [f'message {i}' for i in range(5)]
+    assert history[0].role == 'user' and history[1].role == 'assistant'
+
+
+def test_add_message_to_missing_room(chat_manager):
+    with pytest.raises(ValueError):
+        chat_manager.add_message(999, 'nobody here', 'user')
+
+
+def test_history_limit_keeps_latest_and_relevant(chat_manager):
+    room = chat_manager.create_room('relevance')
+    relevant = chat_manager.add_message(room.id, 'relevant answer', 'assistant',
+                                        context={'metadata': [{'relevance_score': 0.9}]}).id
+    chat_manager.add_message(room.id, 'weak answer', 'assistant',
+                             context={'metadata': [{'relevance_score': 0.2}]})
+    fill(chat_manager, room.id, 5)
+    latest = chat_manager.add_message(room.id, 'latest', 'user').id
+
+    history = chat_manager.get_room_history(room.id, limit=3)
+    assert [msg.id for msg in history] == [relevant, latest]
+    assert history[0].max_relevance == pytest.approx(0.9)
+
+    # Rooms within the limit come back whole
+    assert len(chat_manager.get_room_history(room.id, limit=100)) == 8
+
+
+def test_message_pages_walk_both_directions(chat_manager):
+    room = chat_manager.create_room('pages')
+    ids = fill(chat_manager, room.id, 7)
+
+    page, cursor = chat_manager.get_message_page(room.id, limit=3)
+    assert [msg.id for msg in page] == ids[4:]
+    seen = [msg.id for msg in page]
+    while cursor:
+        page, cursor = chat_manager.get_message_page(room.id, limit=3, before=cursor)
+        seen = [msg.id for msg in page] + seen
+    assert seen == ids
+
+    page, cursor = chat_manager.get_message_page(room.id, limit=3, after=None)
+    first, _ = chat_manager.get_message_page(room.id, limit=2, before=cursor)
+    forward, _ = chat_manager.get_message_page(room.id, limit=10, after=cursor)
+    assert [msg.id for msg in first] == ids[2:4]
+    assert [msg.id for msg in forward] == ids[5:]
+
+    without_context, _ = chat_manager.get_message_page(room.id, limit=1, include_context=False)
+    assert without_context[0].context is None
+
+
+def test_invalid_cursor(chat_manager):
+    room = chat_manager.create_room('cursor')
+    with pytest.raises(ValueError):
+        chat_manager.get_message_page(room.id, limit=5, before='not-a-cursor')
+    with pytest.raises(ValueError):
+        decode_cursor('!!!')
+
+
+def test_speech_rollups_all_time_and_daily(chat_manager):
+    room = chat_manager.create_room('rollups')
+    chat_manager.add_message(room.id, 'first try', 'user', context=metrics(60.0))
+    chat_manager.add_message(room.id, 'second try', 'user', context=metrics(80.0, fluency=70.0))
+    # Assistant replies never count, even with metrics attached
+    chat_manager.add_message(room.id, 'reply', 'assistant', context=metrics(0.0))
+
+    (rollup,) = chat_manager.get_speech_rollups(room.id)
+    assert rollup.count == 2
+    assert rollup.accuracy_sum == pytest.approx(140.0)
+    assert rollup.fluency_sum == pytest.approx(120.0)
+
+    today = datetime.now().date().isoformat()
+    tomorrow = (datetime.now() + timedelta(days=1)).date().isoformat()
+    daily = chat_manager.get_speech_rollups(room.id, start=today, end=today)
+    assert [(r.period, r.count) for r in daily] == [(today, 2)]
+    assert chat_manager.get_speech_rollups(room.id, start=tomorrow) == []
+
+
+@pytest.mark.parametrize('full_text', [True, False], ids=['fts', 'scan'])
+def test_relevant_context(chat_manager, db_engine, monkeypatch, full_text):
+    if full_text and not database.FTS_ENABLED:
+        pytest.skip('FTS5 full-text search is not available on this database')
+    monkeypatch.setattr(database, 'FTS_ENABLED', full_text)
+
+    room = chat_manager.create_room('search')
+    other = chat_manager.create_room('other')
+    match = chat_manager.add_message(room.id, 'The mitochondria is the powerhouse of the cell', 'assistant').id
+    chat_manager.add_message(room.id, 'Photosynthesis happens in chloroplasts', 'assistant')
+    chat_manager.add_message(room.id, 'mitochondria notes uploaded', 'system')
+    chat_manager.add_message(other.id, 'Mitochondria in another room', 'user')
+
+    results = chat_manager.get_relevant_context(room.id, 'What do mitochondria do?')
+    assert [msg.id for msg in results] == [match]
+    assert chat_manager.get_relevant_context(room.id, '???') == []
+
+
+def test_delete_room_removes_messages_and_rollups(chat_manager):
+    room = chat_manager.create_room('delete me')
+    chat_manager.add_message(room.id, 'hello', 'user', context=metrics(90.0))
+
+    assert chat_manager.delete_room(room.id) is True
+    assert chat_manager.get_room(room.id) is None
+    assert chat_manager.get_room_history(room.id) == []
+    assert chat_manager.get_speech_rollups(room.id) == []
+    assert chat_manager.delete_room(room.id) is False
+
+
+def test_history_selection_is_one_statement(chat_manager, db_engine):
+    room_id = chat_manager.create_room('one query').id
+    chat_manager.add_message(room_id, 'relevant answer', 'assistant', context={'metadata': [{'relevance_score': 0.9}]})
+    fill(chat_manager, room_id, 5)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db_engine, 'before_cursor_execute', record)
+    try:
+        history = chat_manager.get_room_history(room_id, limit=3)
+    finally:
+        event.remove(db_engine, 'before_cursor_execute', record)
+
+    assert [msg.content for msg in history] == ['relevant answer', 'message 4']
+    assert len(statements) == 1
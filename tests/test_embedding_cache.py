@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from app.core.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(tmp_path / 'cache.db', max_bytes=10 * 4 * 4, touch_interval=3600, size_resync=3600)
+
+
+def access_times(cache):
+    return dict(cache._conn.execute("SELECT key, last_access FROM embeddings"))
+
+
+def test_hits_do_not_write(cache):
+    cache.put_many({'a': [1.0, 2.0, 3.0, 4.0]})
+    changes = cache._conn.total_changes
+    assert cache.get_many(['a', 'b']) == {'a': [1.0, 2.0, 3.0, 4.0]}
+    assert cache._conn.total_changes == changes
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_stale_access_times_are_refreshed_with_the_next_put(cache):
+    cache.put_many({'a': [1.0] * 4})
+    cache._conn.execute("UPDATE embeddings SET last_access = 0")
+    cache._conn.commit()
+
+    cache.get_many(['a'])
+    assert access_times(cache)['a'] == 0  # Deferred
+    cache.put_many({'b': [2.0] * 4})
+    assert access_times(cache)['a'] > time.time() - 60
+
+
+def test_running_size_evicts_least_recently_used(cache):
+    for i in range(10):
+        cache.put_many({f'k{i}': [float(i)] * 4})
+    assert cache.stats()['size_bytes'] == cache._size == 160
+    assert cache.evictions == 0
+
+    cache.put_many({'k10': [10.0] * 4})
+    stats = cache.stats()
+    assert stats['size_bytes'] == cache._size <= 144
+    assert 'k0' not in cache.get_many(['k0']) and 'k10' in cache.get_many(['k10'])
+
+
+def test_reinserting_a_cached_key_keeps_the_size(cache):
+    cache.put_many({'a': [1.0] * 4})
+    cache.put_many({'a': [1.0] * 4, 'b': [2.0] * 4})
+    assert cache._size == cache.stats()['size_bytes'] == 32
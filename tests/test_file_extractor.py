@@ -0,0 +1,118 @@
+import re
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app.core.file_extractor import TOKEN_PATTERN, iter_chunks, iter_pdf_pages
+from config import Config
+
+SENTENCES = [f'Sentence number {i} talks about topic {i % 7} in some detail.' for i in range(120)]
+
+
+def document_pages(per_page=10):
+    return [(page, ' '.join(SENTENCES[i:i + per_page]))
+            for page, i in enumerate(range(0, len(SENTENCES), per_page), start=1)]
+
+
+def joined(pages):
+    return ' '.join(text for _, text in pages if text)
+
+
+def write_pdf(path, page_count):
+    """A PDF whose page n reads 'Page n of the report'"""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica')
+    })
+    for number in range(1, page_count + 1):
+        page = writer.add_blank_page(width=300, height=200)
+        content = DecodedStreamObject()
+        content.set_data(f'BT /F1 12 Tf 20 100 Td (Page {number} of the report) Tj ET'.encode())
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+@pytest.mark.parametrize('chunk_size,chunk_overlap', [(1000, 200), (100, 80), (120, 0)])
+def test_char_chunks_respect_size_overlap_and_offsets(chunk_size, chunk_overlap):
+    pages = document_pages()
+    document = joined(pages)
+    chunks = list(iter_chunks(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap, unit='chars'))
+
+    assert chunks[0].start == 0 and chunks[-1].end == len(document)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # Offsets point at the chunk's own text; only a closing period may be added
+        assert document[chunk.start:chunk.end] == chunk.text.rstrip('.') or \
+            document[chunk.start:chunk.end] == chunk.text
+        assert chunk.end - chunk.start <= chunk_size
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Chunks move forward and skip nothing but whitespace, overlapping by at
+        # most the overlap and at most half of the previous chunk
+        assert previous.start < chunk.start
+        assert document[previous.end:chunk.start].strip() == ''
+        overlap = max(0, previous.end - chunk.start)
+        assert overlap <= chunk_overlap
+        assert overlap <= (previous.end - previous.start) // 2 + 1
+    if chunk_overlap:
+        assert any(previous.end > chunk.start for previous, chunk in zip(chunks, chunks[1:]))
+
+
+def test_chunks_report_their_pages():
+    pages = document_pages(per_page=30)
+    document = joined(pages)
+    page_starts = [document.index(text) for _, text in pages]
+    chunks = list(iter_chunks(pages, chunk_size=300, chunk_overlap=50, unit='chars'))
+
+    def page_of(offset):
+        return max(i for i, start in enumerate(page_starts, start=1) if start <= offset)
+
+    for chunk in chunks:
+        assert chunk.page_start == page_of(chunk.start)
+        assert chunk.page_end == page_of(chunk.end - 1)
+    assert any(chunk.page_start != chunk.page_end for chunk in chunks)
+
+
+def test_token_chunks_respect_size_and_overlap():
+    pages = document_pages()
+    document = joined(pages)
+    chunks = list(iter_chunks(pages, chunk_size=50, chunk_overlap=10, unit='tokens'))
+
+    assert chunks[0].start == 0 and chunks[-1].end == len(document)
+    for chunk in chunks:
+        assert len(TOKEN_PATTERN.findall(document[chunk.start:chunk.end])) <= 50
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.start < chunk.start
+        assert document[previous.end:chunk.start].strip() == ''
+        assert len(TOKEN_PATTERN.findall(document[chunk.start:previous.end])) <= 10
+    assert any(previous.end > chunk.start for previous, chunk in zip(chunks, chunks[1:]))
+
+
+def test_invalid_chunk_settings():
+    with pytest.raises(ValueError):
+        list(iter_chunks([(1, 'text')], chunk_size=10, chunk_overlap=10))
+    with pytest.raises(ValueError):
+        list(iter_chunks([(1, 'text')], chunk_size=10, chunk_overlap=0, unit='words'))
+
+
+def test_parallel_pdf_pages_stay_in_order(tmp_path, monkeypatch):
+    page_count = Config.PDF_PARALLEL_MIN_PAGES + 6
+    path = tmp_path / 'report.pdf'
+    write_pdf(path, page_count)
+    # Small tasks, so several ranges are in flight and finish out of order
+    monkeypatch.setattr(Config, 'PDF_PAGES_PER_TASK', 5)
+    progress = []
+
+    pages = list(iter_pdf_pages(str(path), workers=2, progress_callback=lambda done, total: progress.append((done, total))))
+    assert [number for number, _ in pages] == list(range(1, page_count + 1))
+    assert all(re.search(rf'\bPage {number} of the report\b', text) for number, text in pages)
+    assert progress == [(number, page_count) for number in range(1, page_count + 1)]
+
+    # The in-process path yields the same pages
+    assert list(iter_pdf_pages(str(path), workers=1)) == pages
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import ingest_jobs
+from app.core.database import IngestJob, Session
+
+
+def add_job(chat_manager, room_id, state='queued', age=timedelta(0), file_path='/nonexistent.pdf'):
+    stamp = datetime.now() - age
+    job = IngestJob(id=f'job{room_id}{state}', room_id=room_id, filename='doc.pdf', file_path=file_path,
+                    state=state, created_at=stamp, updated_at=stamp)
+    chat_manager.session.add(job)
+    chat_manager.session.commit()
+    return job.id
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch, tmp_path):
+    """Replaces extraction and indexing: 100 pages, and records progress writes and deletions"""
+    writes, deleted = [], []
+
+    def pages(path, progress_callback=None):
+        for page in range(1, 101):
+            if progress_callback:
+                progress_callback(page, 100)
+            yield page, f'page {page} text'
+
+    def build(documents, path, name, progress_callback=None):
+        count = 0
+        for _ in documents:
+            count += 1
+            progress_callback(count)
+        return object(), name
+
+    real_run_write = ingest_jobs.run_write
+
+    def counting_run_write(session, apply):
+        writes.append(apply)
+        return real_run_write(session, apply)
+
+    monkeypatch.setattr(ingest_jobs, 'iter_pdf_pages', pages)
+    monkeypatch.setattr(ingest_jobs, 'create_chroma_db', build)
+    monkeypatch.setattr(ingest_jobs, 'delete_chroma_collection', lambda path, name: deleted.append(name))
+    monkeypatch.setattr(ingest_jobs, 'run_write', counting_run_write)
+    document = tmp_path / 'doc.pdf'
+    document.write_bytes(b'%PDF')
+    return writes, deleted, str(document)
+
+
+def test_job_progress_is_throttled_and_old_collection_deleted(chat_manager, fake_pipeline):
+    writes, deleted, document = fake_pipeline
+    room_id = chat_manager.create_room('docs', collection_name='collection_old').id
+    job_id = add_job(chat_manager, room_id, file_path=document)
+
+    ingest_jobs.run_ingest_job(job_id)
+
+    job = ingest_jobs.get_ingest_job(chat_manager, job_id)
+    assert job.state == 'succeeded'
+    assert (job.pages_extracted, job.total_pages) == (100, 100)
+    assert job.chunks_embedded > 0
+    # Claim and swap, not one write per page and per chunk
+    assert len(writes) < 10
+    assert deleted == ['collection_old']
+    assert chat_manager.get_room(room_id).collection_name == job.collection_name
+
+
+def test_polling_a_stale_job_fails_it(chat_manager):
+    room = chat_manager.create_room('stale')
+    running = add_job(chat_manager, room.id, state='running', age=timedelta(hours=2))
+    fresh = add_job(chat_manager, room.id, state='queued')
+
+    job = ingest_jobs.get_ingest_job(chat_manager, running)
+    assert job.state == 'failed'
+    assert 'stopped before it finished' in job.error
+    assert ingest_jobs.get_ingest_job(chat_manager, fresh).state == 'queued'
+
+
+def test_delete_room_removes_its_jobs(chat_manager):
+    room = chat_manager.create_room('jobs')
+    job_id = add_job(chat_manager, room.id, state='succeeded')
+
+    assert chat_manager.delete_room(room.id)
+    Session.remove()
+    assert chat_manager.session.get(IngestJob, job_id) is None
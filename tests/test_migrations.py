@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DatabaseError
+
+from app.core import database
+from app.core.migrations import MIGRATIONS, execute_ddl
+from conftest import drop_schema
+
+
+def test_concurrent_init_db_sets_up_the_schema_once(db_engine):
+    # Start from an empty database, as every gunicorn worker does on first boot
+    drop_schema(db_engine)
+    workers = 4
+    barrier = threading.Barrier(workers)
+    errors = []
+
+    def boot():
+        barrier.wait()
+        try:
+            database.init_db()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=boot) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with db_engine.connect() as conn:
+        versions = [row[0] for row in conn.execute(text('SELECT version FROM schema_migrations ORDER BY version'))]
+    assert versions == sorted(version for version, _, _ in MIGRATIONS)
+    assert 'max_relevance' in {column['name'] for column in inspect(db_engine).get_columns('messages')}
+
+
+def test_ddl_tolerates_objects_that_already_exist(db_engine):
+    with db_engine.begin() as conn:
+        execute_ddl(conn, 'ALTER TABLE messages ADD COLUMN max_relevance FLOAT')
+        execute_ddl(conn, 'CREATE TABLE rooms (id INTEGER PRIMARY KEY)')
+        # The transaction is still usable afterwards
+        conn.execute(text('SELECT count(*) FROM messages')).scalar()
+
+        with pytest.raises(DatabaseError):
+            execute_ddl(conn, 'ALTER TABLE no_such_table ADD COLUMN other FLOAT')
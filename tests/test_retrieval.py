@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.core.lexical_index import BM25Index, BM25IndexBuilder, lexical_index_path, load_lexical_index, tokenize
+from app.core.rag import get_relevant_passage, reciprocal_rank_fusion
+from app.core.reranker import chunk_features, rerank
+
+
+class FakeCollection:
+    """Chroma collection stand-in whose vector search returns a fixed ranking"""
+    def __init__(self, name, chunks, vector_ranking):
+        self.name = name
+        self.chunks = chunks
+        self.vector_ranking = vector_ranking
+
+    def _rows(self, ids):
+        return {
+            'ids': list(ids),
+            'documents': [self.chunks[doc_id][0] for doc_id in ids],
+            'metadatas': [dict(self.chunks[doc_id][1]) for doc_id in ids]
+        }
+
+    def query(self, query_texts, n_results, include):
+        rows = self._rows(self.vector_ranking[:n_results])
+        return {key: [value] for key, value in rows.items()}
+
+    def get(self, ids, include):
+        return self._rows(ids)
+
+
+def build_collection(store_path, name, texts, vector_ranking):
+    builder = BM25IndexBuilder()
+    chunks = {}
+    for i, text in enumerate(texts):
+        doc_id = f'doc{i}'
+        tokens = tokenize(text)
+        builder.add(doc_id, text, tokens=tokens)
+        chunks[doc_id] = (text, {'chunk_index': i, 'total_chunks': len(texts),
+                                 'position': i / len(texts), **chunk_features(tokens)})
+    builder.build().save(lexical_index_path(store_path, name))
+    return FakeCollection(name, chunks, vector_ranking)
+
+
+def test_lexical_index_loads_from_the_collection_store(tmp_path):
+    texts = ['general notes about the warehouse layout'] * 3 + ['spare part XJ-17 sits on shelf abc17']
+    db = build_collection(tmp_path, 'parts', texts, vector_ranking=['doc0', 'doc1'])
+
+    passages, metadata = get_relevant_passage('where is XJ-17', db, n_results=3, store_path=str(tmp_path))
+    assert texts[3] in passages
+    assert all('term_hashes' not in meta and 'relevance_score' in meta for meta in metadata)
+
+
+def test_loading_a_missing_index_creates_nothing(tmp_path):
+    store = tmp_path / 'store'
+    assert load_lexical_index(str(store), 'never_built') is None
+    assert not os.path.exists(store)
+
+
+def bm25(texts):
+    builder = BM25IndexBuilder()
+    for i, text in enumerate(texts):
+        builder.add(f'doc{i}', text)
+    return builder.build()
+
+
+def test_bm25_weights_rare_terms_and_keeps_top_k():
+    index = bm25(['the pump is in aisle one', 'the pump is in aisle two',
+                  'the XJ-17 valve is in aisle three', 'nothing relevant here'])
+
+    assert index.search('where is the xj-17 valve', 2)[0][0] == 'doc2'
+    hits = index.search('pump aisle', 10)
+    assert {doc_id for doc_id, _ in hits} == {'doc0', 'doc1', 'doc2'}
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert len(index.search('pump aisle', 1)) == 1
+    assert index.search('missing words', 5) == []
+
+
+def test_bm25_save_and_load_round_trip(tmp_path):
+    index = bm25(['alpha beta', 'beta gamma gamma', 'delta'])
+    path = lexical_index_path(tmp_path, 'roundtrip')
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 3
+    np.testing.assert_allclose(loaded.score('gamma beta'), index.score('gamma beta'))
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([['a', 'b'], ['b', 'c']], k=60)
+    assert fused['b'] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused['a'] == pytest.approx(1 / 61)
+    assert fused['c'] == pytest.approx(1 / 62)
+    assert sorted(fused, key=fused.get, reverse=True) == ['b', 'a', 'c']
+    assert reciprocal_rank_fusion([]) == {}
+
+
+def test_rerank_retrieval_signals_outweigh_priors():
+    # Candidate 0 is the strongest match but short and near the end of the document;
+    # candidate 1 is a long opening chunk that barely matches
+    fused = np.array([0.032, 0.016, 0.015], dtype=np.float32)
+    positions = np.array([0.9, 0.0, 0.5], dtype=np.float32)
+    word_counts = np.array([8, 200, 150], dtype=np.float32)
+    overlap = np.array([1.0, 0.2, 0.2], dtype=np.float32)
+    lexical = np.array([9.0, 0.5, 0.0], dtype=np.float32)
+
+    top, scores = rerank(fused, positions, word_counts, overlap, 2, lexical_scores=lexical)
+    assert top.tolist() == [0, 1]
+    assert scores.shape == (3,)
+
+    # Without a lexical index the remaining signals still decide
+    top, _ = rerank(fused, positions, word_counts, overlap, 3)
+    assert top[0] == 0
+
+
+def test_exact_term_chunk_ranks_first(tmp_path):
+    # Every long chunk shares the query's common words and is the only thing the
+    # vector search returns; the short chunk deep in the document holds the exact terms
+    filler = 'the warehouse keeps general stock in aisles where is the usual question asked by staff ' * 6
+    texts = [f'section {i} {filler}' for i in range(19)]
+    texts.insert(17, 'XJ-17 is stored in bin abc17.')
+    db = build_collection(tmp_path, 'probe', texts, vector_ranking=[f'doc{i}' for i in range(20) if i != 17])
+
+    passages, metadata = get_relevant_passage('where is XJ-17 abc17', db, n_results=3, store_path=str(tmp_path))
+    assert passages[0] == texts[17]
+    assert metadata[0]['relevance_score'] == max(meta['relevance_score'] for meta in metadata)
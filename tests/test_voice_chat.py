@@ -0,0 +1,86 @@
+import base64
+import io
+import threading
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.core import stt
+from fakes import FakeSpeechClient
+
+
+def spoken_clip(seconds: float = 1.6, sample_rate: int = 16000) -> bytes:
+    """WAV bytes of a voiced tone (F0 150 Hz) with silence around it"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 5)) * 0.2
+    samples[t < 0.2] = 0
+    buffer = io.BytesIO()
+    sf.write(buffer, samples.astype(np.float32), sample_rate, format='WAV')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def voice_client(db_engine, monkeypatch):
+    from app import create_app
+    from app.api import routes
+
+    fake = FakeSpeechClient('I like learning English')
+    stt.set_speech_client(fake)
+    monkeypatch.setattr(routes, 'generate_chat_reply', lambda query, **kwargs: 'Great, why do you like it?')
+    monkeypatch.setattr(routes, 'synthesize_reply', lambda content: None)
+    app = create_app()
+    app.testing = True
+    with app.test_client() as client:
+        yield client, fake
+    stt.set_speech_client(None)  # The next caller creates a real client again
+
+
+def test_voice_chat_recognizes_once(voice_client):
+    client, fake = voice_client
+    room_id = client.post('/api/rooms', json={'name': 'voice'}).get_json()['id']
+
+    response = client.post(f'/api/rooms/{room_id}/voice_chat',
+                           json={'audio': base64.b64encode(spoken_clip()).decode('ascii')})
+    assert response.status_code == 200, response.get_json()
+
+    # One recognition request feeds both the transcript and pronunciation scoring
+    assert len(fake.calls) == 1
+    result = response.get_json()
+    assert result['transcription'] == 'I like learning English'
+    assert result['content'] == 'Great, why do you like it?'
+    metrics = result['speech_metrics']
+    assert metrics['accuracy'] > 0
+    assert [entry['word'] for entry in metrics['pitch_analysis']] == ['I', 'like', 'learning', 'English']
+    assert set(result['stage_timings_ms']) >= {'recognition', 'pronunciation', 'pitch', 'generation', 'total'}
+
+    messages = client.get(f'/api/rooms/{room_id}/messages').get_json()
+    assert [msg['role'] for msg in messages] == ['user', 'assistant']
+
+
+def test_reply_is_stored_while_speech_is_synthesized(voice_client, monkeypatch):
+    from app.api import routes
+
+    client, _ = voice_client
+    stored = threading.Event()
+    add_message = routes.chat_manager.add_message
+
+    def recording_add_message(*args, **kwargs):
+        message = add_message(*args, **kwargs)
+        if kwargs.get('role') == 'assistant':
+            stored.set()
+        return message
+
+    def synthesize(content):
+        # Only finishes once the reply has been stored, i.e. both overlapped
+        return 'c3BlZWNo' if stored.wait(timeout=2) else None
+
+    monkeypatch.setattr(routes.chat_manager, 'add_message', recording_add_message)
+    monkeypatch.setattr(routes, 'synthesize_reply', synthesize)
+    room_id = client.post('/api/rooms', json={'name': 'overlap'}).get_json()['id']
+
+    response = client.post(f'/api/rooms/{room_id}/voice_chat',
+                           json={'audio': base64.b64encode(spoken_clip()).decode('ascii')})
+    result = response.get_json()
+    assert result['response_audio'] == 'c3BlZWNo'
+    assert {'tts', 'store_reply'} <= set(result['stage_timings_ms'])
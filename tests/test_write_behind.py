@@ -0,0 +1,101 @@
+import json
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.core import chat_room
+from app.core.chat_room import ChatManager
+
+
+@pytest.fixture
+def write_behind_managers(db_engine, monkeypatch):
+    """Two managers in write-behind mode, like the routes' manager and an ingestion job's"""
+    monkeypatch.setattr(chat_room, '_write_behind', None)
+    managers = ChatManager('.', write_behind=True), ChatManager('.', write_behind=True)
+    yield managers
+    managers[0].flush()
+
+
+def test_managers_share_one_queue_and_flusher(write_behind_managers):
+    routes_manager, job_manager = write_behind_managers
+    assert routes_manager.write_behind is job_manager.write_behind
+
+    def flushers():
+        return sum(1 for t in threading.enumerate() if t.name == 'message-write-behind' and t.is_alive())
+
+    before = flushers()
+    room = routes_manager.create_room('shared')
+    for i in range(3):
+        job_manager.add_message(room.id, f'queued {i}', 'system')
+        routes_manager.add_message(room.id, f'reply {i}', 'assistant')
+    assert flushers() - before == 1
+
+    # Read-your-writes holds across managers in the same process
+    history = routes_manager.get_room_history(room.id)
+    assert [msg.content for msg in history] == ['queued 0', 'reply 0', 'queued 1', 'reply 1', 'queued 2', 'reply 2']
+
+
+def test_immediate_insert_returns_id_after_queued_messages(write_behind_managers):
+    manager, _ = write_behind_managers
+    room = manager.create_room('immediate')
+    queued = manager.add_message(room.id, 'question', 'user')
+    assert queued.id is None
+
+    reply = manager.add_message(room.id, 'answer', 'assistant', immediate=True)
+    assert isinstance(reply.id, int)
+    assert [msg.content for msg in manager.get_room_history(room.id)] == ['question', 'answer']
+
+
+def test_streamed_reply_done_event_has_id(db_engine, monkeypatch):
+    from app import create_app
+    from app.api import routes
+
+    monkeypatch.setattr(chat_room, '_write_behind', None)
+    monkeypatch.setattr(routes, 'chat_manager', ChatManager('.', write_behind=True))
+    monkeypatch.setattr(routes, 'stream_chat_reply', lambda *args, **kwargs: iter(['Hello', ' there']))
+    app = create_app()
+    app.testing = True
+    with app.test_client() as client:
+        room_id = client.post('/api/rooms', json={'name': 'stream'}).get_json()['id']
+        body = client.post(f'/api/rooms/{room_id}/chat?stream=1', json={'message': 'hi'}).get_data(as_text=True)
+
+    done = json.loads(body.split('event: done\ndata: ')[1].split('\n')[0])
+    assert isinstance(done['id'], int)
+    history = routes.chat_manager.get_room_history(room_id)
+    assert [(msg.role, msg.content) for msg in history] == [('user', 'hi'), ('assistant', 'Hello there')]
+
+
+def test_add_message_validates_before_queuing(write_behind_managers):
+    manager, _ = write_behind_managers
+    room = manager.create_room('validation')
+    for room_id, content, role in ((room.id, None, 'user'), (room.id, 'hello', None), (999, 'hello', 'user')):
+        with pytest.raises(ValueError):
+            manager.add_message(room_id, content, role)
+    assert manager.write_behind.stats()['pending'] == 0
+
+
+def test_failing_batch_is_retried_then_bad_rows_dead_lettered(write_behind_managers, monkeypatch):
+    manager, _ = write_behind_managers
+    queue = manager.write_behind
+    monkeypatch.setattr(queue, 'max_retries', 2)
+    # Only the explicit flushes below run; the background flusher stays asleep
+    monkeypatch.setattr(queue, 'flush_interval', 3600)
+    room = manager.create_room('poison')
+    manager.add_message(room.id, 'before', 'user')
+    # A row that slipped past validation; the database rejects it
+    queue.add({'room_id': room.id, 'content': None, 'role': 'user', 'timestamp': datetime.now(),
+               'max_relevance': None, 'context': None})
+    manager.add_message(room.id, 'after', 'assistant')
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            queue.flush()
+        assert queue.stats()['pending'] == 3
+
+    assert queue.flush() == 2
+    assert queue.flush() == 0
+    stats = queue.stats()
+    assert (stats['pending'], stats['dead_lettered']) == (0, 1)
+    assert queue.dead_letters[-1][0]['content'] is None
+    assert [msg.content for msg in manager.get_room_history(room.id)] == ['before', 'after']